@@ -0,0 +1,10 @@
+### Restricted data policy, shared by the SQL bot and its tooling
+
+# Define restricted tables and columns
+RESTRICTED_TABLES = ["chat_message", "chat_message_entity", "chat_room", "chat_room_participants"
+                     , "drug", "symptom"]
+OWNER_ACCESSED_ONLY_TABLES = ['appointment', "examination_detail", "image", "medical_bill", "patient", "prescribed_drugs"]
+RESTRICTED_COLUMNS = {
+    "doctor": ["password", "email"],
+    "patient": ["password", "email"],
+}
@@ -0,0 +1,135 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Iterable, Optional
+
+from invalidation import changed_since, on_tables_changed
+from text_utils import normalize_question
+
+
+### Answer cache
+# Sits in front of unified_bot.get_answer. Keys are normalized questions, entries are evicted
+# LRU-first once the byte cap is reached, and each route has its own freshness policy:
+# - rag: static knowledge base, cached for a long time
+# - sql: expires with the most volatile table the generated query touched, or when we write to it
+# - function_call: changes state, never cached
+
+RAG_TTL = float(os.getenv("ANSWER_CACHE_RAG_TTL", "86400"))
+SQL_DEFAULT_TTL = float(os.getenv("ANSWER_CACHE_SQL_TTL", "300"))
+MAX_BYTES = int(os.getenv("ANSWER_CACHE_MAX_BYTES", str(8 * 1024 * 1024)))
+
+# Seconds a SQL answer stays fresh, per table it reads
+TABLE_TTLS = {
+    "appointment": 30,
+    "medical_bill": 60,
+    "examination_detail": 60,
+    "prescribed_drugs": 60,
+    "patient": 300,
+    "doctor": 3600,
+    "department": 86400,
+}
+
+UNCACHEABLE_PREFIXES = ("Error", "Failed to generate response")
+
+# Rough per-entry bookkeeping overhead (tuple, dict slot, floats), added to the string sizes
+ENTRY_OVERHEAD = 200
+
+
+def sql_ttl(tables: Iterable[str]) -> float:
+    return min((TABLE_TTLS.get(table, SQL_DEFAULT_TTL) for table in tables), default=SQL_DEFAULT_TTL)
+
+
+class AnswerCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_puts = 0
+
+    def get(self, question: str) -> Optional[str]:
+        key = normalize_question(question)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            answer, route, tables, expires_at, size = entry
+            if time.monotonic() >= expires_at:
+                self._remove(key)
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return answer
+
+    def put(self, question: str, route: str, answer: str, tables: Iterable[str] = (),
+            generation: Optional[int] = None):
+        """Store an answer according to its route's policy; returns False if it was not cacheable.
+
+        generation: invalidation.generation() from before the answer was computed; the answer is
+        dropped if one of its tables was written to since.
+        """
+        if route == "function_call" or not answer or answer.startswith(UNCACHEABLE_PREFIXES):
+            return False
+        tables = frozenset(tables)
+        ttl = RAG_TTL if route == "rag" else sql_ttl(tables)
+        key = normalize_question(question)
+        size = len(key.encode()) + len(answer.encode()) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if generation is not None and changed_since(tables, generation):
+                self.stale_puts += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (answer, route, tables, time.monotonic() + ttl, size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                oldest = next(iter(self._entries))
+                self._remove(oldest)
+                self.evictions += 1
+        return True
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every SQL answer that read one of the given tables."""
+        tables = set(tables)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[2] & tables]
+            for key in stale:
+                self._remove(key)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "stale_puts": self.stale_puts,
+        }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size_bytes -= entry[4]
+
+
+answer_cache = AnswerCache()
+on_tables_changed(answer_cache.invalidate_tables)
@@ -0,0 +1,467 @@
+import os
+import re
+import threading
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+import sqlalchemy
+
+from lazy import lazy
+from time_slots import TimeSlot
+
+
+### Doctor availability index
+# Free-slot questions used to cost two LLM calls and an anti-join over appointment. The index
+# keeps one byte per doctor and day (a bit per time slot) for a window of days, plus each
+# doctor's working weekdays, so "who is free Monday at 7am" is a couple of array lookups.
+# It is loaded from the database, patched in place when our own booking API calls succeed,
+# and reloaded when older than AVAILABILITY_REFRESH_SECONDS (bookings made elsewhere).
+
+AVAILABILITY_INDEX = os.getenv("AVAILABILITY_INDEX", "1") == "1"
+AVAILABILITY_DAYS = int(os.getenv("AVAILABILITY_DAYS", "60"))
+AVAILABILITY_REFRESH_SECONDS = float(os.getenv("AVAILABILITY_REFRESH_SECONDS", "60"))
+# First day of the window (YYYY-MM-DD); today when unset
+AVAILABILITY_START = os.getenv("AVAILABILITY_START")
+
+# Slot names as stored in appointment.time_slot, their labels, and start hours read from the names
+SLOTS = tuple(slot.name for slot in TimeSlot)
+SLOT_LABELS = tuple(slot.value for slot in TimeSlot)
+SLOT_START_HOURS = tuple(int(slot.name.split("_")[1]) for slot in TimeSlot)
+ALL_SLOTS = (1 << len(SLOTS)) - 1
+
+WEEKDAYS = ("MONDAY", "TUESDAY", "WEDNESDAY", "THURSDAY", "FRIDAY", "SATURDAY", "SUNDAY")
+
+# Columns the index reads, by role, and the names each may have in the clinic schema. Names are
+# matched against the inspected columns ignoring case and underscores, so doctor_id and doctorId
+# both match. Without the required ones the index does not load and questions go to the SQL bot.
+COLUMN_CANDIDATES = {
+    "doctor": {
+        "id": ("id", "doctor_id"),
+        "first_name": ("first_name",),
+        "last_name": ("last_name",),
+        "name": ("name", "full_name", "doctor_name"),
+        "working_days": ("working_days", "work_days"),
+    },
+    "appointment": {
+        "id": ("id", "appointment_id"),
+        "doctor_id": ("doctor_id",),
+        "date": ("appointment_date", "date"),
+        "time_slot": ("time_slot", "slot"),
+        "status": ("status", "appointment_status"),
+    },
+}
+REQUIRED_COLUMNS = {"doctor": ("id",), "appointment": ("id", "doctor_id", "date", "time_slot")}
+
+
+def _resolve_columns(table: str, columns: List[str]) -> Dict[str, str]:
+    """Role -> actual column name for the roles the table has; raises if a required one is missing."""
+    by_key = {column.replace("_", "").lower(): column for column in columns}
+    resolved = {}
+    for role, candidates in COLUMN_CANDIDATES[table].items():
+        for candidate in candidates:
+            column = by_key.get(candidate.replace("_", "").lower())
+            if column is not None:
+                resolved[role] = column
+                break
+    missing = [role for role in REQUIRED_COLUMNS[table] if role not in resolved]
+    if missing:
+        raise LookupError(f"{table} has no column for {', '.join(missing)}")
+    return resolved
+
+
+def _doctor_name(doctor) -> str:
+    # (id, first_name, last_name, name, working_days); the ID when the schema has no name columns
+    parts = [str(part) for part in doctor[1:3] if part]
+    return " ".join(parts) or (str(doctor[3]) if doctor[3] else str(doctor[0]))
+
+
+def _parse_day(value) -> date:
+    return value if isinstance(value, date) else datetime.strptime(str(value)[:10], "%Y-%m-%d").date()
+
+
+class _Grid(NamedTuple):
+    """One load of the index. Replaced as a whole by _load, so a lookup reads a single grid."""
+    start: Optional[date]
+    booked: np.ndarray  # slot bits per doctor row and day; patched in place under the index lock
+    working: np.ndarray  # working weekdays per doctor row
+    working_known: np.ndarray  # whether the doctor's working days are recorded at all
+    rows: Dict[int, int]
+    doctor_ids: np.ndarray
+    names: List[str]
+    appointments: Dict[int, Tuple[int, int, int]]  # id -> (row, day, slot bit)
+
+
+class AvailabilityIndex:
+    def __init__(self, engine: Callable[[], sqlalchemy.engine.Engine], days: int = AVAILABILITY_DAYS,
+                 refresh_interval: float = AVAILABILITY_REFRESH_SECONDS, start: Optional[str] = AVAILABILITY_START):
+        self._engine = engine
+        self.days = days
+        self.refresh_interval = refresh_interval
+        self._fixed_start = _parse_day(start) if start else None
+        self._lock = threading.Lock()
+        self._attempted_at: Optional[float] = None
+        self._grid = self._empty_grid()
+        self.loads = 0
+        self.load_failures = 0
+        self.load_seconds = 0.0
+        self.bookings = 0
+        self.cancellations = 0
+        self.lookups = 0
+
+    ### Loading
+
+    def needs_refresh(self) -> bool:
+        # Failed loads count as attempts too, so a schema mismatch or an outage is retried once
+        # per refresh interval instead of on every question
+        return self._attempted_at is None or time.monotonic() - self._attempted_at >= self.refresh_interval
+
+    def ensure_fresh(self) -> "AvailabilityIndex":
+        if self.needs_refresh():
+            with self._lock:
+                if self.needs_refresh():
+                    self._attempted_at = time.monotonic()
+                    try:
+                        self._load()
+                    except Exception:
+                        # Until the next attempt every lookup answers None (the SQL bot takes over)
+                        self._grid = self._empty_grid()
+                        self.load_failures += 1
+                        raise
+        return self
+
+    def invalidate(self):
+        """Reload on next access."""
+        self._attempted_at = None
+
+    def _empty_grid(self) -> _Grid:
+        return _Grid(None, np.zeros((0, self.days), dtype=np.uint8), np.zeros((0, 7), dtype=bool),
+                     np.zeros(0, dtype=bool), {}, np.zeros(0, dtype=np.int64), [], {})
+
+    def _load(self):
+        started = time.perf_counter()
+        engine = self._engine()
+        inspector = sqlalchemy.inspect(engine)
+        doctor = _resolve_columns("doctor", [column["name"] for column in inspector.get_columns("doctor")])
+        appointment = _resolve_columns("appointment", [column["name"] for column in inspector.get_columns("appointment")])
+        quote = engine.dialect.identifier_preparer.quote
+        start = self._fixed_start or date.today()
+        end = start + timedelta(days=self.days)
+
+        def select(columns: Dict[str, str], *roles: str) -> str:
+            return ", ".join(quote(columns[role]) if role in columns else "NULL" for role in roles)
+
+        with engine.connect() as conn:
+            doctors = conn.execute(sqlalchemy.text(
+                f"SELECT {select(doctor, 'id', 'first_name', 'last_name', 'name', 'working_days')} "
+                f"FROM doctor ORDER BY {quote(doctor['id'])}"
+            )).fetchall()
+            day_column = quote(appointment["date"])
+            appointments = conn.execute(sqlalchemy.text(
+                f"SELECT {select(appointment, 'id', 'doctor_id', 'date', 'time_slot', 'status')} FROM appointment "
+                f"WHERE {day_column} >= :start AND {day_column} < :end"
+            ), {"start": start, "end": end}).fetchall()
+
+        rows = {int(doctor[0]): row for row, doctor in enumerate(doctors)}
+        working = np.zeros((len(doctors), 7), dtype=bool)
+        # No working-days column, or no value for a doctor: the index cannot say when they work
+        working_known = np.zeros(len(doctors), dtype=bool)
+        for row, doctor in enumerate(doctors):
+            if doctor[4]:
+                # A comma-separated string, or a set from MySQL SET columns
+                value = doctor[4] if isinstance(doctor[4], str) else ",".join(doctor[4])
+                named = set(re.findall(r"[A-Za-z]+", value.upper()))
+                working[row] = [weekday in named for weekday in WEEKDAYS]
+                working_known[row] = True
+        booked = np.zeros((len(doctors), self.days), dtype=np.uint8)
+        index = {}
+        for appointment_id, doctor_id, day, slot, state in appointments:
+            row = rows.get(doctor_id)
+            if row is None or slot not in SLOTS or (state or "").upper() == "CANCELLED":
+                continue
+            offset = (_parse_day(day) - start).days
+            bit = 1 << SLOTS.index(slot)
+            booked[row, offset] |= bit
+            index[int(appointment_id)] = (row, offset, bit)
+
+        self._grid = _Grid(start, booked, working, working_known, rows,
+                           np.array([int(doctor[0]) for doctor in doctors], dtype=np.int64),
+                           [_doctor_name(doctor) for doctor in doctors], index)
+        self.loads += 1
+        self.load_seconds = time.perf_counter() - started
+
+    ### Incremental updates from our own booking calls
+
+    @property
+    def start(self) -> Optional[date]:
+        return self._grid.start
+
+    def _cell(self, grid: _Grid, doctor_id: int, day: date) -> Optional[Tuple[int, int]]:
+        row = grid.rows.get(doctor_id)
+        if row is None or grid.start is None:
+            return None
+        offset = (day - grid.start).days
+        return (row, offset) if 0 <= offset < self.days else None
+
+    def record_booking(self, doctor_id: int, day: date, slot: str, appointment_id: Optional[int] = None):
+        with self._lock:
+            grid = self._grid
+            cell = self._cell(grid, doctor_id, day)
+            if cell is None:
+                return
+            bit = 1 << SLOTS.index(slot)
+            grid.booked[cell] |= bit
+            if appointment_id is not None:
+                grid.appointments[appointment_id] = (cell[0], cell[1], bit)
+            self.bookings += 1
+
+    def record_cancellation(self, appointment_id: int):
+        with self._lock:
+            grid = self._grid
+            cell = grid.appointments.pop(appointment_id, None)
+            if cell is None:
+                # Booked after the last load without a known ID, or outside the window
+                self.invalidate()
+                return
+            row, offset, bit = cell
+            grid.booked[row, offset] &= ~bit & 0xFF
+            self.cancellations += 1
+
+    ### Lookups; None means the index cannot tell (unknown doctor or working days, day outside the window)
+    # Each lookup takes self._grid once, so a concurrent reload cannot mix two loads' arrays.
+
+    def _snapshot(self) -> _Grid:
+        self.ensure_fresh()
+        self.lookups += 1
+        return self._grid
+
+    @staticmethod
+    def _free_bits(grid: _Grid, rows, offset: int, day: date) -> np.ndarray:
+        free = ~grid.booked[rows, offset] & ALL_SLOTS
+        return np.where(grid.working[rows, day.weekday()], free, 0)
+
+    def _day_offset(self, grid: _Grid, day: date) -> Optional[int]:
+        if grid.start is None or not 0 <= (day - grid.start).days < self.days:
+            return None
+        return (day - grid.start).days
+
+    def is_free(self, doctor_id: int, day: date, slot: str) -> Optional[bool]:
+        grid = self._snapshot()
+        cell = self._cell(grid, doctor_id, day)
+        if cell is None or not grid.working_known[cell[0]]:
+            return None
+        return bool(self._free_bits(grid, cell[0], cell[1], day) & (1 << SLOTS.index(slot)))
+
+    def is_booked(self, doctor_id: int, day: date, slot: str) -> Optional[bool]:
+        """Whether the slot already has an appointment, whatever the doctor's working days."""
+        grid = self._snapshot()
+        cell = self._cell(grid, doctor_id, day)
+        if cell is None:
+            return None
+        return bool(grid.booked[cell] & (1 << SLOTS.index(slot)))
+
+    def works_on(self, doctor_id: int, day: date) -> Optional[bool]:
+        grid = self._grid
+        row = grid.rows.get(doctor_id)
+        if row is None or not grid.working_known[row]:
+            return None
+        return bool(grid.working[row, day.weekday()])
+
+    def free_slots(self, doctor_id: int, day: date) -> Optional[List[str]]:
+        """Labels of the doctor's free slots that day."""
+        grid = self._snapshot()
+        cell = self._cell(grid, doctor_id, day)
+        if cell is None or not grid.working_known[cell[0]]:
+            return None
+        bits = int(self._free_bits(grid, cell[0], cell[1], day))
+        return [label for i, label in enumerate(SLOT_LABELS) if bits >> i & 1]
+
+    def free_doctors(self, day: date, slot: str) -> Optional[List[Tuple[int, str]]]:
+        """(doctor id, name) of every doctor free in that slot."""
+        grid = self._snapshot()
+        offset = self._day_offset(grid, day)
+        if offset is None or not grid.working_known.all():
+            return None
+        rows = np.arange(len(grid.names))
+        free = self._free_bits(grid, rows, offset, day) & (1 << SLOTS.index(slot))
+        return [(int(grid.doctor_ids[row]), grid.names[row]) for row in np.flatnonzero(free)]
+
+    def free_counts(self, day: date) -> Optional[List[int]]:
+        """Number of free doctors per slot that day."""
+        grid = self._snapshot()
+        offset = self._day_offset(grid, day)
+        if offset is None or not grid.working_known.all():
+            return None
+        free = self._free_bits(grid, np.arange(len(grid.names)), offset, day)
+        return [int(np.count_nonzero(free >> i & 1)) for i in range(len(SLOTS))]
+
+    def doctor_name(self, doctor_id: int) -> Optional[str]:
+        grid = self._grid
+        row = grid.rows.get(doctor_id)
+        return None if row is None else grid.names[row]
+
+    def stats(self) -> dict:
+        grid = self._grid
+        return {
+            "doctors": len(grid.names),
+            "days": self.days,
+            "booked_slots": int(np.unpackbits(grid.booked).sum()),
+            "bytes": grid.booked.nbytes + grid.working.nbytes,
+            "loads": self.loads,
+            "load_seconds": self.load_seconds,
+            "load_failures": self.load_failures,
+            "bookings": self.bookings,
+            "cancellations": self.cancellations,
+            "lookups": self.lookups,
+        }
+
+
+def _clinic_engine():
+    # The SQL bot's engine and pool; imported here so the booking bot does not load the SQL bot at import
+    from sql_bot import get_db
+    return get_db()._engine
+
+
+availability = AvailabilityIndex(_clinic_engine)
+
+lazy("availability", availability.ensure_fresh)
+
+
+### Free-slot questions answered from the index
+
+_FREE = re.compile(r"\b(free|available|availability|vacant)\b", re.I)
+_SUBJECT = re.compile(r"\b(doctors?|dr|slots?|appointments?|schedule)\b", re.I)
+_ACTION = re.compile(r"\b(book|cancel|reschedule|change|update|delete)\b", re.I)
+_DOCTOR_ID = re.compile(r"\b(?:doctor|dr)\.?\s*(?:id)?\s*(?:is)?\s*[:#=]?\s*(\d+)", re.I)
+_ISO_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_WEEKDAY = re.compile(r"\b(this|next)?\s*(monday|tuesday|wednesday|thursday|friday|saturday|sunday)\b", re.I)
+_WEEK = re.compile(r"\b(this|next)\s+week\b", re.I)
+_HOUR = re.compile(r"\b(\d{1,2})(?::(\d{2}))?\s*(am|pm|a\.m\.|p\.m\.|h)\b", re.I)
+# Filters the index does not model; questions using them go to the SQL bot
+_DEPARTMENT = re.compile(
+    r"\b(departments?|dept|specialt(y|ies)|specialities|specialists?|wards?|surgery|surgeons?|dentists?|dental"
+    r"|\w+olog(y|ists?|ical)|\w*iatric(s|ians?)?|\w+opedics?)\b", re.I)
+# "Dr. Smith", "doctor Nguyen": a doctor named without an ID
+_DOCTOR_NAME = re.compile(r"\b(?i:dr)\.?\s+(?!(?i:id)\b)[A-Za-z]|\b(?i:doctor)\s+(?!(?i:id)\b)[A-Z][a-z]")
+_NEGATION = re.compile(r"\b(not|no|never|none|unavailable|busy)\b|n't\b", re.I)
+_PAST = re.compile(r"\b(last|yesterday|was|were|previous|ago)\b", re.I)
+
+
+def _question_days(question: str, today: date) -> Optional[List[date]]:
+    if match := _ISO_DATE.search(question):
+        try:
+            return [datetime.strptime(match.group(0), "%Y-%m-%d").date()]
+        except ValueError:
+            return None
+    lowered = question.lower()
+    if "tomorrow" in lowered:
+        return [today + timedelta(days=1)]
+    if "today" in lowered:
+        return [today]
+    if match := _WEEKDAY.search(question):
+        weekday = WEEKDAYS.index(match.group(2).upper())
+        day = today + timedelta(days=(weekday - today.weekday()) % 7)
+        return [day + timedelta(days=7) if (match.group(1) or "").lower() == "next" else day]
+    if match := _WEEK.search(question):
+        monday = today - timedelta(days=today.weekday())
+        if match.group(1).lower() == "next":
+            return [monday + timedelta(days=7 + i) for i in range(7)]
+        return [today + timedelta(days=i) for i in range(7 - today.weekday())]
+    return None
+
+
+def _question_slot(question: str) -> Tuple[bool, Optional[str]]:
+    """(whether a time was given, the slot starting at that hour)."""
+    match = _HOUR.search(question)
+    if match is None:
+        return False, None
+    hour, suffix = int(match.group(1)), match.group(3).lower()
+    if suffix.startswith("p") and hour < 12:
+        hour += 12
+    if match.group(2) not in (None, "00") or hour not in SLOT_START_HOURS:
+        return True, None
+    return True, SLOTS[SLOT_START_HOURS.index(hour)]
+
+
+def _format_day(day: date) -> str:
+    return f"{WEEKDAYS[day.weekday()].capitalize()} {day.isoformat()}"
+
+
+def is_free_slot_question(question: str) -> bool:
+    """Cheap check for questions about free doctors or slots (not booking requests)."""
+    return (AVAILABILITY_INDEX and _FREE.search(question) is not None and _SUBJECT.search(question) is not None
+            and _ACTION.search(question) is None)
+
+
+def _index_can_answer(question: str, doctor_match) -> bool:
+    """False for questions narrowed by something the index ignores: a department or specialty,
+    a doctor by name, a negation ("not available") or a past day ("last Monday")."""
+    if _DEPARTMENT.search(question) or _NEGATION.search(question) or _PAST.search(question):
+        return False
+    return doctor_match is not None or _DOCTOR_NAME.search(question) is None
+
+
+def free_slot_answer(question: str, index: AvailabilityIndex = availability, today: Optional[date] = None) -> Optional[str]:
+    """Answer a doctor availability question from the index; None when it is not one or the index cannot tell."""
+    if not is_free_slot_question(question):
+        return None
+    doctor_match = _DOCTOR_ID.search(question)
+    if not _index_can_answer(question, doctor_match):
+        return None
+    days = _question_days(question, today or date.today())
+    if not days:
+        return None
+    has_time, slot = _question_slot(question)
+    if has_time and slot is None:
+        return f"Appointments are only available in these time slots: {', '.join(SLOT_LABELS)}."
+
+    try:
+        index.ensure_fresh()
+    except Exception as e:
+        print(f"Availability index unavailable, using the SQL bot: {e}")
+        return None
+
+    lines = []
+    if doctor_match:
+        doctor_id = int(doctor_match.group(1))
+        name = index.doctor_name(doctor_id)
+        if name is None:
+            return None
+        for day in days:
+            free = index.free_slots(doctor_id, day)
+            if free is None:
+                return None
+            if slot is not None:
+                label = SLOT_LABELS[SLOTS.index(slot)]
+                if not index.works_on(doctor_id, day):
+                    lines.append(f"Doctor {name} (ID {doctor_id}) does not work on {_format_day(day)}.")
+                elif label in free:
+                    lines.append(f"Doctor {name} (ID {doctor_id}) is free on {_format_day(day)}, {label}.")
+                else:
+                    lines.append(f"Doctor {name} (ID {doctor_id}) is already booked on {_format_day(day)}, {label}.")
+            elif free:
+                lines.append(f"Doctor {name} (ID {doctor_id}) is free on {_format_day(day)}: {', '.join(free)}.")
+            else:
+                lines.append(f"Doctor {name} (ID {doctor_id}) has no free slots on {_format_day(day)}.")
+        return "\n".join(lines)
+
+    for day in days:
+        if slot is not None:
+            doctors = index.free_doctors(day, slot)
+            if doctors is None:
+                return None
+            label = SLOT_LABELS[SLOTS.index(slot)]
+            if not doctors:
+                lines.append(f"No doctor is free on {_format_day(day)}, {label}.")
+                continue
+            shown = ", ".join(f"{name} (ID {doctor_id})" for doctor_id, name in doctors[:10])
+            more = f" and {len(doctors) - 10} more" if len(doctors) > 10 else ""
+            lines.append(f"Doctors free on {_format_day(day)}, {label}: {shown}{more}.")
+        else:
+            counts = index.free_counts(day)
+            if counts is None:
+                return None
+            free = [f"{label} ({count} doctors)" for label, count in zip(SLOT_LABELS, counts) if count]
+            lines.append(f"{_format_day(day)}: {', '.join(free) if free else 'no free slots'}.")
+    return "\n".join(lines)
@@ -0,0 +1,211 @@
+# bench_e2e.py
+# Offline end-to-end benchmark of unified_bot.aget_answer: fake LLM (bench_fixtures), seeded
+# SQLite clinic database, stub booking API (stub_backend). Reports requests/s, p50/p95/p99 per
+# route and the per-stage breakdown from the tracing spans.
+# Run with: python bench_e2e.py [--requests 500] [--concurrency 32] [--llm-latency 0.05]
+#           [--backend-latency 0.02] [--mode async|sync] [--answer-cache]
+#           [--router-mode separate|combined] [--no-local-router] [--no-prefetch] [--no-result-cache]
+#           [--no-availability]
+
+import argparse
+import asyncio
+import contextlib
+import io
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+
+def percentile(samples, q: float) -> float:
+    ordered = sorted(samples)
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, int(round(q * len(ordered))) - 1))]
+
+
+def workload(count: int, doctors: int, patients: int, seed: int = 11):
+    """(route, question) pairs in a fixed mix: 50% sql, 35% rag, 15% function_call."""
+    from rag_bot import faqs
+    rng = random.Random(seed)
+    faq_questions = list(faqs)
+    slots = ["7am to 8am", "8am to 9am", "9am to 10am", "1pm to 2pm", "2pm to 3pm", "3pm to 4pm"]
+    items = []
+    for _ in range(count):
+        draw = rng.random()
+        if draw < 0.5:
+            items.append(("sql", rng.choice([
+                f"List my appointments. My patient ID is {rng.randint(1, patients)}.",
+                f"Show the schedule of doctor ID {rng.randint(1, doctors)}",
+                "Show all doctors along with their departments and IDs.",
+                "How many appointments do we have?",
+                f"Which doctors are free on 2024-11-{rng.randint(4, 29):02d} at {rng.choice(['7am', '9am', '2pm'])}?",
+                f"Is doctor ID {rng.randint(1, doctors)} available on 2024-11-{rng.randint(4, 29):02d}?",
+            ])))
+        elif draw < 0.85:
+            items.append(("rag", rng.choice(faq_questions + ["Hi", "Is there parking at the hospital?"])))
+        elif draw < 0.95:
+            items.append(("function_call",
+                          f"Book an appointment with doctor ID {rng.randint(1, doctors)} for patient ID "
+                          f"{rng.randint(1, patients)} on 2025-0{rng.randint(1, 9)}-{rng.randint(10, 28)} "
+                          f"at {rng.choice(slots)}"))
+        else:
+            items.append(("function_call", f"Cancel appointment ID {rng.randint(1, 50)} because I am sick"))
+    return items
+
+
+def setup(args):
+    """Point the bots at the fixtures; must run before the bot modules are imported."""
+    from bench_fixtures import seed_clinic_db
+    from stub_backend import start_stub_backend
+
+    db_path = os.path.join(tempfile.mkdtemp(prefix="clinic-bench-"), "clinic.db")
+    seed_clinic_db(f"sqlite:///{db_path}", doctors=args.doctors, patients=args.patients,
+                   appointments=args.appointments)
+    backend, _ = start_stub_backend(latency=args.backend_latency)
+    os.environ["CLINIC_DB_URI"] = f"sqlite:///{db_path}"
+    os.environ["BOOKING_API_BASE_URL"] = backend.base_url
+    os.environ["SQL_QUERY_PROMPT_FROM_HUB"] = "0"
+    os.environ["ROUTER_MODE"] = args.router_mode
+    if args.no_local_router:
+        os.environ["ROUTER_CONFIDENCE_THRESHOLD"] = "2"  # every question goes to the router LLM
+    os.environ["SPECULATIVE_PREFETCH"] = "0" if args.no_prefetch else "1"
+    os.environ["AVAILABILITY_INDEX"] = "0" if args.no_availability else "1"
+    os.environ["AVAILABILITY_START"] = "2024-11-01"  # seed_clinic_db's first appointment day
+
+    from bench_fixtures import fake_llm_factory
+    from llm_registry import llm_registry
+    from pipelines import pipelines
+    from lazy import warm_up
+    import unified_bot
+    from answer_cache import answer_cache
+    from result_cache import result_cache
+
+    llm_registry.set_factory(fake_llm_factory(args.llm_latency))
+    pipelines.compile_all()
+    warm_up()
+    if not args.answer_cache:
+        answer_cache.max_bytes = 0  # nothing fits, every request runs its pipeline
+    if args.no_result_cache:
+        result_cache.max_bytes = 0  # every SQL query goes to the database
+    return unified_bot
+
+
+def run_one(unified_bot, route, question, results):
+    from tracing import request_context
+    with request_context(f"bench-{len(results)}") as trace:
+        start = time.perf_counter()
+        unified_bot.get_answer(question)
+        results.append((route, time.perf_counter() - start, list(trace.spans)))
+
+
+async def arun_one(unified_bot, route, question, results, semaphore):
+    from tracing import request_context
+    async with semaphore:
+        with request_context(f"bench-{len(results)}") as trace:
+            start = time.perf_counter()
+            await unified_bot.aget_answer(question)
+            results.append((route, time.perf_counter() - start, list(trace.spans)))
+
+
+def run(args, unified_bot, items):
+    results = []
+    start = time.perf_counter()
+    # The bots print routing decisions; keep them out of the report
+    with contextlib.redirect_stdout(io.StringIO()):
+        if args.mode == "sync":
+            with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+                list(pool.map(lambda item: run_one(unified_bot, *item, results), items))
+        else:
+            async def main():
+                semaphore = asyncio.Semaphore(args.concurrency)
+                await asyncio.gather(*(arun_one(unified_bot, *item, results, semaphore) for item in items))
+            asyncio.run(main())
+    return results, time.perf_counter() - start
+
+
+def report(args, results, elapsed):
+    print(f"{len(results)} requests, {args.mode} mode, concurrency {args.concurrency}, router {args.router_mode}"
+          f"{' (LLM only)' if args.no_local_router else ''}{', no prefetch' if args.no_prefetch else ''}, "
+          f"LLM latency {args.llm_latency * 1000:.0f} ms, backend latency {args.backend_latency * 1000:.0f} ms")
+    print(f"Throughput: {len(results) / elapsed:.1f} req/s over {elapsed:.2f} s\n")
+
+    by_route = defaultdict(list)
+    stages = defaultdict(lambda: defaultdict(list))
+    for route, seconds, spans in results:
+        by_route[route].append(seconds)
+        by_route["all"].append(seconds)
+        for stage, stage_seconds in spans:
+            stages[route][stage].append(stage_seconds)
+
+    print(f"{'route':<15}{'count':>7}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'mean ms':>10}")
+    for route in ["sql", "rag", "function_call", "all"]:
+        samples = by_route.get(route)
+        if samples:
+            print(f"{route:<15}{len(samples):>7}{percentile(samples, 0.5) * 1000:>10.1f}"
+                  f"{percentile(samples, 0.95) * 1000:>10.1f}{percentile(samples, 0.99) * 1000:>10.1f}"
+                  f"{statistics.mean(samples) * 1000:>10.1f}")
+
+    print("\nPer-stage breakdown (spans per request, mean / p95 ms)")
+    for route in ["sql", "rag", "function_call"]:
+        if route not in stages:
+            continue
+        print(f"  {route}")
+        for stage, samples in stages[route].items():
+            print(f"    {stage:<18}{len(samples) / len(by_route[route]):>6.2f}x"
+                  f"{statistics.mean(samples) * 1000:>10.2f}{percentile(samples, 0.95) * 1000:>10.2f}")
+
+    from result_cache import result_cache
+    cache = result_cache.stats()
+    if cache["hits"] + cache["misses"]:
+        print(f"\nSQL result cache: hit rate {cache['hit_rate']:.0%}, {cache['invalidations']} entries invalidated by writes")
+        for table, counts in sorted(result_cache.table_stats().items()):
+            print(f"    {table:<18}{counts['hits']:>6} hits{counts['misses']:>6} misses{counts['hit_rate']:>7.0%}"
+                  f"{counts['invalidated']:>6} invalidated")
+
+    from sql_bot import schema_linker
+    linking = schema_linker.stats()
+    if linking["questions"]:
+        print(f"\nSchema linking: {linking['linked']} of {linking['questions']} write_query prompts pruned "
+              f"(avg {linking['avg_tables_linked']:.1f} tables), {linking['schema_tokens_saved']} of "
+              f"{linking['schema_tokens_full']} schema tokens saved")
+
+    from speculation import speculation_stats
+    spec = speculation_stats.stats()
+    if spec["started"]:
+        print(f"\nSpeculative prefetch: {spec['started']} started, used {spec['used']}, wasted {spec['wasted']}, "
+              f"{spec['failed']} failed")
+        print(f"  off the critical path {spec['used_seconds'] * 1000:.1f} ms, waited for {spec['wait_seconds'] * 1000:.1f} ms, "
+              f"wasted {spec['wasted_seconds'] * 1000:.1f} ms")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmark")
+    parser.add_argument("--requests", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="seconds per fake LLM call")
+    parser.add_argument("--backend-latency", type=float, default=0.02, help="seconds per stub backend call")
+    parser.add_argument("--mode", choices=["async", "sync"], default="async")
+    parser.add_argument("--answer-cache", action="store_true", help="keep the answer cache on")
+    parser.add_argument("--router-mode", choices=["separate", "combined"], default="separate")
+    parser.add_argument("--no-local-router", action="store_true", help="route every question with the LLM")
+    parser.add_argument("--no-prefetch", action="store_true", help="no speculative prefetch while routing")
+    parser.add_argument("--no-result-cache", action="store_true", help="turn the SQL result cache off")
+    parser.add_argument("--no-availability", action="store_true", help="free-slot questions go through the SQL bot")
+    parser.add_argument("--doctors", type=int, default=30)
+    parser.add_argument("--patients", type=int, default=500)
+    parser.add_argument("--appointments", type=int, default=5000)
+    args = parser.parse_args(argv)
+
+    unified_bot = setup(args)
+    items = workload(args.requests, args.doctors, args.patients)
+    results, elapsed = run(args, unified_bot, items)
+    report(args, results, elapsed)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
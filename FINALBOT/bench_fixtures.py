@@ -0,0 +1,225 @@
+# bench_fixtures.py
+# Offline stand-ins for the benchmark suite: a deterministic fake chat model with configurable
+# latency, and a seeded SQLite database mirroring the clinic_management schema. The stub
+# booking API lives in stub_backend.py.
+
+import asyncio
+import json
+import random
+import re
+import time
+from datetime import date, timedelta
+from typing import Any, List, Optional
+
+import sqlalchemy
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+
+### Fake LLM
+# Recognizes the prompts the bots send (router, text-to-SQL, action extraction) and answers
+# them from the question text, so every route runs end to end without OpenAI.
+
+SLOT_NAMES = {
+    "7am to 8am": "SLOT_7_TO_8", "8am to 9am": "SLOT_8_TO_9", "9am to 10am": "SLOT_9_TO_10",
+    "1pm to 2pm": "SLOT_13_TO_14", "2pm to 3pm": "SLOT_14_TO_15", "3pm to 4pm": "SLOT_15_TO_16",
+}
+
+_QUESTION = re.compile(r"(?:Question|\*\*Question\*\*):\s*(.*?)(?:\n|$)")
+_ID = re.compile(r"\b(doctor|patient|appointment)\s*(?:id)?\s*(?:is)?\s*[:#=]?\s*(\d+)", re.I)
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+_SLOT = re.compile(r"\b(\d{1,2}(?:am|pm) to \d{1,2}(?:am|pm))\b", re.I)
+
+
+def _question(prompt: str) -> str:
+    match = _QUESTION.search(prompt)
+    return match.group(1).strip() if match else prompt
+
+
+def _ids(question: str) -> dict:
+    return {kind.lower(): int(value) for kind, value in _ID.findall(question)}
+
+
+def fake_route(question: str) -> str:
+    lowered = question.lower()
+    if re.search(r"\b(book|cancel|reschedule)\b", lowered) and _ID.search(question):
+        return "function_call"
+    if re.search(r"\b(list|show|how many|which|free|available|schedule|count)\b", lowered):
+        return "sql"
+    return "rag"
+
+
+def fake_sql(question: str) -> str:
+    lowered = question.lower()
+    ids = _ids(question)
+    if "department" in lowered:
+        return ("SELECT d.id, d.first_name, d.last_name, dep.name AS department FROM doctor d "
+                "JOIN department dep ON d.department_id = dep.id LIMIT 10;")
+    if "patient" in ids:
+        return ("SELECT a.id, a.appointment_date, a.time_slot, d.first_name, d.last_name FROM appointment a "
+                f"JOIN doctor d ON a.doctor_id = d.id WHERE a.patient_id = {ids['patient']} "
+                "ORDER BY a.appointment_date DESC LIMIT 10;")
+    if "doctor" in ids:
+        return ("SELECT appointment_date, time_slot FROM appointment "
+                f"WHERE doctor_id = {ids['doctor']} ORDER BY appointment_date LIMIT 10;")
+    if "how many" in lowered or "count" in lowered:
+        return "SELECT COUNT(*) FROM appointment;"
+    return "SELECT id, first_name, last_name FROM doctor LIMIT 10;"
+
+
+def fake_action(question: str) -> dict:
+    ids = _ids(question)
+    if re.search(r"\bcancel\b", question, re.I) and "appointment" in ids:
+        return {"action": "cancel_appointment",
+                "parameters": {"appointmentId": ids["appointment"], "reason": "benchmark"}}
+    date_match, slot_match = _DATE.search(question), _SLOT.search(question)
+    if "doctor" in ids and "patient" in ids and date_match and slot_match:
+        return {"action": "book_appointment", "parameters": {
+            "doctorId": ids["doctor"], "patientId": ids["patient"],
+            "appointmentDate": date_match.group(0), "timeSlot": slot_match.group(1).lower(),
+        }}
+    return {"action": "missing_info", "parameters": {"missing": "doctorId, patientId, appointmentDate, timeSlot"}}
+
+
+def fake_reply(prompt: str) -> str:
+    if "intelligent routing system" in prompt and "book_appointment" in prompt:
+        # Combined router: route plus the action fields for function calls
+        question = _question(prompt)
+        system = fake_route(question)
+        if system != "function_call":
+            return json.dumps({"system": system, "action": None})
+        action = fake_action(question)
+        return json.dumps({"system": system, "action": action["action"], **action["parameters"]})
+    if "intelligent routing system" in prompt:
+        return json.dumps({"system": fake_route(_question(prompt))})
+    if "syntactically correct" in prompt:
+        return json.dumps({"query": fake_sql(_question(prompt))})
+    if "'action', 'parameters'" in prompt:
+        return json.dumps(fake_action(_question(prompt)))
+    return "Here is what I found for your question, based on the information available."
+
+
+class FakeChatModel(BaseChatModel):
+    """Deterministic chat model that sleeps `latency` seconds per call, like a remote LLM would."""
+
+    model: str = "fake"
+    latency: float = 0.0
+
+    @property
+    def _llm_type(self) -> str:
+        return "fake-clinic"
+
+    def _result(self, messages: List[BaseMessage]) -> ChatResult:
+        prompt = "\n".join(str(message.content) for message in messages)
+        reply = fake_reply(prompt)
+        usage = {"prompt_tokens": len(prompt) // 4, "completion_tokens": len(reply) // 4}
+        return ChatResult(generations=[ChatGeneration(message=AIMessage(content=reply))],
+                          llm_output={"token_usage": usage})
+
+    def _generate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        if self.latency:
+            time.sleep(self.latency)
+        return self._result(messages)
+
+    async def _agenerate(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        return self._result(messages)
+
+    async def _astream(self, messages: List[BaseMessage], stop: Optional[List[str]] = None, run_manager=None, **kwargs):
+        # latency is the time to the first token; the rest follows word by word
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        reply = self._result(messages).generations[0].message.content
+        for word in re.findall(r"\S+\s*", reply):
+            yield ChatGenerationChunk(message=AIMessageChunk(content=word))
+            await asyncio.sleep(0)
+
+    def with_structured_output(self, schema: Any, **kwargs):
+        # The fake replies with JSON already shaped like RouterOutput / QueryOutput
+        return self | JsonOutputParser()
+
+
+def fake_llm_factory(latency: float = 0.0):
+    """A factory for llm_registry.set_factory()."""
+    def factory(model: str, callbacks=None, **params):
+        return FakeChatModel(model=model, latency=latency, callbacks=callbacks)
+    return factory
+
+
+### SQLite clinic fixture
+# Same tables and columns the bots query in clinic_management, restricted ones included.
+
+CLINIC_SCHEMA = [
+    "CREATE TABLE department (id INTEGER PRIMARY KEY, name TEXT, description TEXT)",
+    "CREATE TABLE doctor (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, password TEXT, "
+    "phone TEXT, working_days TEXT, department_id INTEGER REFERENCES department(id))",
+    "CREATE TABLE patient (id INTEGER PRIMARY KEY, first_name TEXT, last_name TEXT, email TEXT, password TEXT, "
+    "phone TEXT, date_of_birth DATE)",
+    "CREATE TABLE appointment (id INTEGER PRIMARY KEY, doctor_id INTEGER REFERENCES doctor(id), "
+    "patient_id INTEGER REFERENCES patient(id), appointment_date DATE, time_slot TEXT, status TEXT)",
+    "CREATE TABLE examination_detail (id INTEGER PRIMARY KEY, appointment_id INTEGER REFERENCES appointment(id), "
+    "diagnosis TEXT, notes TEXT)",
+    "CREATE TABLE medical_bill (id INTEGER PRIMARY KEY, patient_id INTEGER REFERENCES patient(id), "
+    "appointment_id INTEGER REFERENCES appointment(id), total_amount INTEGER, created_at DATE)",
+    "CREATE TABLE drug (id INTEGER PRIMARY KEY, name TEXT, price INTEGER)",
+    "CREATE TABLE prescribed_drugs (id INTEGER PRIMARY KEY, examination_detail_id INTEGER "
+    "REFERENCES examination_detail(id), drug_id INTEGER REFERENCES drug(id), quantity INTEGER)",
+    "CREATE TABLE symptom (id INTEGER PRIMARY KEY, name TEXT)",
+    "CREATE TABLE chat_room (id INTEGER PRIMARY KEY, name TEXT)",
+    "CREATE TABLE chat_room_participants (chat_room_id INTEGER REFERENCES chat_room(id), user_id INTEGER)",
+    "CREATE TABLE chat_message (id INTEGER PRIMARY KEY, chat_room_id INTEGER REFERENCES chat_room(id), "
+    "sender_id INTEGER, content TEXT)",
+    "CREATE TABLE chat_message_entity (id INTEGER PRIMARY KEY, chat_message_id INTEGER "
+    "REFERENCES chat_message(id), entity TEXT)",
+]
+
+DEPARTMENTS = ["General Practice", "Cardiology", "Pediatrics", "Surgery", "Dermatology", "Neurology"]
+FIRST_NAMES = ["An", "Binh", "Chi", "Dung", "Giang", "Hoa", "Khanh", "Lan", "Minh", "Nam", "Phuong", "Quan"]
+LAST_NAMES = ["Nguyen", "Tran", "Le", "Pham", "Hoang", "Vu", "Dang", "Bui", "Do", "Ngo"]
+
+
+def seed_clinic_db(uri: str, doctors: int = 30, patients: int = 500, appointments: int = 5000,
+                   start: date = date(2024, 11, 1), days: int = 60, seed: int = 7) -> sqlalchemy.engine.Engine:
+    """Create and fill the clinic schema (dropping what is there); returns the engine."""
+    rng = random.Random(seed)
+    engine = sqlalchemy.create_engine(uri)
+    slots = list(SLOT_NAMES.values())
+    with engine.begin() as conn:
+        for table in reversed([statement.split()[2] for statement in CLINIC_SCHEMA]):
+            conn.exec_driver_sql(f"DROP TABLE IF EXISTS {table}")
+        for statement in CLINIC_SCHEMA:
+            conn.exec_driver_sql(statement)
+        conn.exec_driver_sql(
+            "INSERT INTO department (id, name, description) VALUES (?, ?, ?)",
+            [(i + 1, name, f"{name} department") for i, name in enumerate(DEPARTMENTS)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO doctor VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            [(i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"doctor{i}@clinic.vn", "secret",
+              f"0900{i:06d}", "MONDAY,TUESDAY,WEDNESDAY,THURSDAY,FRIDAY", rng.randint(1, len(DEPARTMENTS)))
+             for i in range(1, doctors + 1)],
+        )
+        conn.exec_driver_sql(
+            "INSERT INTO patient VALUES (?, ?, ?, ?, ?, ?, ?)",
+            [(i, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), f"patient{i}@mail.vn", "secret",
+              f"0910{i:06d}", (date(1950, 1, 1) + timedelta(days=rng.randint(0, 25000))).isoformat())
+             for i in range(1, patients + 1)],
+        )
+        booked = set()
+        rows = []
+        while len(rows) < appointments and len(booked) < doctors * days * len(slots):
+            key = (rng.randint(1, doctors), (start + timedelta(days=rng.randrange(days))).isoformat(), rng.choice(slots))
+            if key in booked:
+                continue
+            booked.add(key)
+            rows.append((len(rows) + 1, key[0], rng.randint(1, patients), key[1], key[2],
+                         rng.choice(["BOOKED", "BOOKED", "BOOKED", "DONE", "CANCELLED"])))
+        conn.exec_driver_sql("INSERT INTO appointment VALUES (?, ?, ?, ?, ?, ?)", rows)
+        conn.exec_driver_sql(
+            "INSERT INTO medical_bill VALUES (?, ?, ?, ?, ?)",
+            [(row[0], row[2], row[0], rng.choice([70000, 150000, 300000]), row[3]) for row in rows if row[5] == "DONE"],
+        )
+    return engine
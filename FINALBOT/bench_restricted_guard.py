@@ -0,0 +1,147 @@
+# bench_restricted_guard.py
+# Micro-benchmark: restricted-name check of generated answers on whole answers and on token
+# streams: the legacy per-name loop, a single compiled regex, RestrictedGuard, and the
+# growing-buffer StreamGuard that RestrictedGuard.stream replaced.
+# Run with: python bench_restricted_guard.py [iterations] [answer_words]
+
+import random
+import re
+import sys
+import timeit
+
+from access_policy import RESTRICTED_TABLES, RESTRICTED_COLUMNS
+from restricted_guard import RestrictedGuard
+
+TABLE_DENIED = "table denied"
+COLUMN_DENIED = "column denied"
+
+WORDS = ("the doctor has appointments on monday and tuesday between 7am and 10am patient id department "
+         "cardiology schedule available slot booked total bill amount vnd examination result").split()
+
+
+### Legacy check, as generate_answer's final validation worked before RestrictedGuard
+
+def legacy_guard_answer(answer: str) -> str:
+    for table in RESTRICTED_TABLES:
+        if table in answer:
+            return TABLE_DENIED
+    for table, columns in RESTRICTED_COLUMNS.items():
+        for column in columns:
+            if column in answer:
+                return COLUMN_DENIED
+    return answer
+
+
+def legacy_stream(chunks) -> str:
+    # Without an incremental scanner the stream is buffered and checked once it is complete
+    return legacy_guard_answer("".join(chunks))
+
+
+def regex_guard(restricted_tables, restricted_columns):
+    """Single-pass alternative: one alternation regex, tables before columns."""
+    tables = sorted(restricted_tables, key=len, reverse=True)
+    columns = sorted({column for names in restricted_columns.values() for column in names}, key=len, reverse=True)
+    pattern = re.compile(f"(?P<table>{'|'.join(map(re.escape, tables))})|(?P<column>{'|'.join(map(re.escape, columns))})")
+
+    def guard_answer(answer: str) -> str:
+        match = pattern.search(answer)
+        if match is None:
+            return answer
+        if match.group("table") is not None or any(table in answer for table in tables):
+            return TABLE_DENIED
+        return COLUMN_DENIED
+    return guard_answer
+
+
+def buffered_stream_guard(chunks) -> str:
+    """The previous StreamGuard: the whole text is kept and re-sliced on every chunk."""
+    names = [(table, TABLE_DENIED) for table in RESTRICTED_TABLES] + [
+        (column, COLUMN_DENIED) for columns in RESTRICTED_COLUMNS.values() for column in columns
+    ]
+    hold = max(len(name) for name, _ in names) - 1
+    text, released, parts = "", 0, []
+    for chunk in chunks:
+        window_start = max(released - hold, 0)
+        text += chunk
+        window = text[window_start:]
+        for name, message in names:
+            if name in window:
+                return message
+        release_to = max(len(text) - hold, released)
+        parts.append(text[released:release_to])
+        released = release_to
+    parts.append(text[released:])
+    return "".join(parts)
+
+
+def guarded_stream(guard: RestrictedGuard, chunks) -> str:
+    stream = guard.stream()
+    parts = []
+    for chunk in chunks:
+        parts.append(stream.feed(chunk))
+        if stream.denial is not None:
+            return stream.denial
+    parts.append(stream.finish())
+    return "".join(parts)
+
+
+def make_answers(count: int, words: int, seed: int = 5):
+    """Long clean answers, plus some with a restricted name near the end or split across tokens."""
+    rng = random.Random(seed)
+    names = RESTRICTED_TABLES + [column for columns in RESTRICTED_COLUMNS.values() for column in columns]
+    answers = []
+    for i in range(count):
+        text = [rng.choice(WORDS) for _ in range(words)]
+        if i % 4 == 3:
+            text.insert(rng.randrange(len(text) * 3 // 4, len(text)), rng.choice(names))
+        answers.append(" ".join(text))
+    return answers
+
+
+def tokens(answer: str):
+    # Chunks shaped like LLM stream deltas: a word or a piece of one
+    return re.findall(r"\S{1,4}\s*|\s+", answer)
+
+
+def main(iterations: int = 50, words: int = 400):
+    guard = RestrictedGuard(RESTRICTED_TABLES, RESTRICTED_COLUMNS, TABLE_DENIED, COLUMN_DENIED)
+    regex = regex_guard(RESTRICTED_TABLES, RESTRICTED_COLUMNS)
+    answers = make_answers(40, words)
+    streams = [tokens(answer) for answer in answers]
+
+    agree = all(guard.guard(answer) == regex(answer) == legacy_guard_answer(answer) for answer in answers)
+    # A stream is cut at the first name it reaches, so only denied-or-not is compared
+    stream_agree = all(
+        (guarded_stream(guard, chunks) == "".join(chunks)) == (legacy_stream(chunks) == "".join(chunks))
+        for chunks in streams
+    )
+
+    def per_answer_us(func, inputs):
+        seconds = timeit.timeit(lambda: [func(item) for item in inputs], number=iterations)
+        return seconds / (iterations * len(inputs)) * 1e6
+
+    print(f"{len(answers)} answers of ~{words} words ({sum(map(len, answers)) // len(answers)} chars, "
+          f"~{sum(map(len, streams)) // len(streams)} stream chunks), {iterations} iterations")
+    print(f"verdicts agree: whole {agree}, streamed {stream_agree}")
+    print(f"legacy substring loop:       {per_answer_us(legacy_guard_answer, answers):9.1f} us/answer")
+    print(f"single compiled regex:       {per_answer_us(regex, answers):9.1f} us/answer")
+    print(f"RestrictedGuard.guard:       {per_answer_us(guard.guard, answers):9.1f} us/answer")
+    print(f"buffered StreamGuard:        {per_answer_us(buffered_stream_guard, streams):9.1f} us/answer")
+    print(f"RestrictedGuard.stream:      {per_answer_us(lambda chunks: guarded_stream(guard, chunks), streams):9.1f} us/answer")
+
+    # Where the stream stops for denied answers: characters produced before the cut-off
+    cut = []
+    for chunks in streams:
+        stream = guard.stream()
+        for chunk in chunks:
+            stream.feed(chunk)
+            if stream.denial is not None:
+                cut.append(len(stream.text) / len("".join(chunks)))
+                break
+    if cut:
+        print(f"{len(cut)} denied streams stop after {sum(cut) / len(cut):.0%} of the answer on average "
+              f"(a check after generation reads all of it)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50, int(sys.argv[2]) if len(sys.argv) > 2 else 400)
@@ -0,0 +1,79 @@
+# bench_sql_validator.py
+# Micro-benchmark: validation cost per query, legacy recursive validator vs SQLValidator.
+# Run with: python bench_sql_validator.py [iterations]
+
+import sys
+import timeit
+
+import sqlparse
+from sqlparse.sql import IdentifierList, Identifier
+
+from access_policy import RESTRICTED_TABLES, RESTRICTED_COLUMNS
+from sql_validator import SQLValidator
+
+# Queries shaped like what write_query generates for our usual questions
+GENERATED_SQL = [
+    "SELECT id, first_name, last_name FROM doctor LIMIT 10;",
+    "SELECT d.id, d.first_name, d.last_name, dep.name AS department FROM doctor d JOIN department dep ON d.department_id = dep.id LIMIT 10;",
+    "SELECT a.id, a.appointment_date, a.time_slot, d.first_name, d.last_name FROM appointment a JOIN doctor d ON a.doctor_id = d.id WHERE a.patient_id = 10 ORDER BY a.appointment_date DESC LIMIT 10;",
+    "SELECT d.id, d.first_name, d.last_name FROM doctor d WHERE d.id NOT IN (SELECT a.doctor_id FROM appointment a WHERE a.appointment_date = '2024-11-25' AND a.time_slot = 'SLOT_7_TO_8') LIMIT 10;",
+    "SELECT COUNT(*) FROM appointment WHERE appointment_date = CURDATE();",
+    "SELECT dep.name, COUNT(a.id) AS total FROM appointment a JOIN doctor d ON a.doctor_id = d.id JOIN department dep ON d.department_id = dep.id GROUP BY dep.name ORDER BY total DESC LIMIT 10;",
+    "SELECT mb.id, mb.total_amount, mb.created_at FROM medical_bill mb WHERE mb.patient_id = 7 ORDER BY mb.created_at DESC LIMIT 10;",
+    "SELECT first_name, last_name, email FROM patient LIMIT 10;",
+    "SELECT * FROM chat_message WHERE chat_room_id = 3;",
+    "SELECT d.first_name, d.last_name, d.working_days FROM doctor d WHERE d.last_name LIKE '%Nguyen%' LIMIT 10;",
+]
+
+
+### Legacy validator, as RestrictedSQLDatabase.is_query_valid worked before SQLValidator
+
+def _extract_identifiers(token_list):
+    identifiers = []
+    for token in token_list.tokens:
+        if isinstance(token, IdentifierList):
+            for identifier in token.get_identifiers():
+                identifiers.append(identifier)
+        elif isinstance(token, Identifier):
+            identifiers.append(token)
+        elif token.is_group:
+            identifiers.extend(_extract_identifiers(token))
+    return identifiers
+
+def legacy_is_query_valid(query: str) -> bool:
+    for statement in sqlparse.parse(query):
+        if statement.get_type() not in ('SELECT'):
+            return False
+        for identifier in _extract_identifiers(statement):
+            name = identifier.get_real_name()
+            if name in RESTRICTED_TABLES:
+                return False
+            for table, columns in RESTRICTED_COLUMNS.items():
+                if name in columns:
+                    return False
+    return True
+
+
+def per_query_us(func, iterations: int) -> float:
+    seconds = timeit.timeit(lambda: [func(query) for query in GENERATED_SQL], number=iterations)
+    return seconds / (iterations * len(GENERATED_SQL)) * 1e6
+
+
+def main(iterations: int = 200):
+    cached = SQLValidator(RESTRICTED_TABLES, RESTRICTED_COLUMNS)
+    cached_verdicts = [cached.is_valid(query) for query in GENERATED_SQL]
+    legacy_verdicts = [legacy_is_query_valid(query) for query in GENERATED_SQL]
+
+    def cold(query):
+        # Fresh validator: single-pass analysis without the verdict cache
+        return SQLValidator(RESTRICTED_TABLES, RESTRICTED_COLUMNS).is_valid(query)
+
+    print(f"{len(GENERATED_SQL)} generated queries, {iterations} iterations")
+    print(f"verdicts agree: {cached_verdicts == legacy_verdicts}")
+    print(f"legacy recursive validator: {per_query_us(legacy_is_query_valid, iterations):9.1f} us/query")
+    print(f"SQLValidator, cold:         {per_query_us(cold, iterations):9.1f} us/query")
+    print(f"SQLValidator, cached:       {per_query_us(cached.is_valid, iterations):9.1f} us/query")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200)
@@ -0,0 +1,63 @@
+# bench_startup.py
+# Cold-start benchmark: import time of each bot module in a fresh interpreter, then (with
+# --warmup) how long each lazy component takes to build. No network is needed for the imports.
+# Run with: python bench_startup.py [runs] [--warmup]
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+MODULES = ["rag_bot", "function_call_bot", "sql_bot", "unified_bot", "server"]
+
+_IMPORT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+_WARMUP = """
+import json, time
+start = time.perf_counter()
+import server
+from pipelines import pipelines
+from lazy import warm_up
+imported = time.perf_counter() - start
+compile_seconds = sum(pipelines.compile_all().values())
+components = warm_up()
+print(json.dumps({"import": imported, "compile": compile_seconds, "components": components}))
+"""
+
+
+def _run(code: str) -> str:
+    here = os.path.dirname(os.path.abspath(__file__))
+    result = subprocess.run([sys.executable, "-c", code], cwd=here, capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    return result.stdout.strip().splitlines()[-1]
+
+
+def import_seconds(module: str, runs: int) -> list:
+    return [float(_run(_IMPORT.format(module=module))) for _ in range(runs)]
+
+
+def main(runs: int, warmup: bool):
+    print(f"Import time, fresh interpreter, {runs} runs")
+    for module in MODULES:
+        try:
+            samples = import_seconds(module, runs)
+        except RuntimeError as e:
+            print(f"  {module:<18} failed: {e}")
+            continue
+        print(f"  {module:<18} median {statistics.median(samples) * 1000:8.1f} ms   max {max(samples) * 1000:8.1f} ms")
+
+    if warmup:
+        report = json.loads(_run(_WARMUP))
+        print(f"\nStartup with warmup: import {report['import'] * 1000:.1f} ms, pipeline compile {report['compile'] * 1000:.1f} ms")
+        for name, component in report["components"].items():
+            if component["error"]:
+                print(f"  {name:<18} failed: {component['error']}")
+            else:
+                print(f"  {name:<18} {component['init_seconds'] * 1000:8.1f} ms")
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if arg != "--warmup"]
+    main(int(args[0]) if args else 3, "--warmup" in sys.argv)
@@ -0,0 +1,75 @@
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+
+from text_utils import content_terms
+
+
+### FAQ retrieval engine
+# BM25 over an inverted index that is built once. Each posting list stores document ids and
+# precomputed BM25 term weights as NumPy arrays, so a query is a handful of vectorized
+# scatter-adds plus an argpartition, whatever the size of the knowledge base.
+
+class FAQMatch(NamedTuple):
+    question: str
+    answer: str
+    score: float  # BM25 score normalized to 0..1 by the query's best possible score
+    coverage: float  # share of the query's content terms found in the FAQ question
+
+
+class FAQIndex:
+    def __init__(self, faqs: Dict[str, str], k1: float = 1.5, b: float = 0.75, question_weight: int = 2):
+        self.k1 = k1
+        self.questions = list(faqs.keys())
+        self.answers = list(faqs.values())
+        self._question_terms = [set(content_terms(question)) for question in self.questions]
+        # Questions are what users paraphrase, so their terms count more than the answer's
+        documents = [
+            content_terms(question) * question_weight + content_terms(answer)
+            for question, answer in faqs.items()
+        ]
+        lengths = np.array([len(doc) for doc in documents], dtype=float)
+        average_length = lengths.mean() if len(documents) else 1.0
+
+        term_frequencies: Dict[str, Dict[int, int]] = {}
+        for doc_id, doc in enumerate(documents):
+            for term in doc:
+                postings = term_frequencies.setdefault(term, {})
+                postings[doc_id] = postings.get(doc_id, 0) + 1
+
+        n = len(documents)
+        self.idf: Dict[str, float] = {}
+        self.postings: Dict[str, tuple] = {}
+        for term, postings in term_frequencies.items():
+            doc_ids = np.fromiter(postings.keys(), dtype=np.int32, count=len(postings))
+            tf = np.fromiter(postings.values(), dtype=float, count=len(postings))
+            idf = np.log(1 + (n - len(postings) + 0.5) / (len(postings) + 0.5))
+            norm = k1 * (1 - b + b * lengths[doc_ids] / average_length)
+            self.idf[term] = idf
+            self.postings[term] = (doc_ids, idf * tf * (k1 + 1) / (tf + norm))
+
+    def __len__(self) -> int:
+        return len(self.questions)
+
+    def search(self, question: str, k: int = 3, threshold: float = 0.0) -> List[FAQMatch]:
+        """Top-k FAQ entries for the question, best first, with normalized scores >= threshold."""
+        query_terms = set(content_terms(question))
+        terms = [term for term in query_terms if term in self.postings]
+        if not terms:
+            return []
+        scores = np.zeros(len(self.questions))
+        for term in terms:
+            doc_ids, weights = self.postings[term]
+            scores[doc_ids] += weights
+        # A document can score at most idf * (k1 + 1) per query term. Terms the index has never
+        # seen are left out here, so a high score alone can rest on a single common word.
+        scores /= sum(self.idf[term] for term in terms) * (self.k1 + 1)
+
+        k = min(k, len(scores))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [
+            FAQMatch(self.questions[i], self.answers[i], float(scores[i]),
+                     len(query_terms & self._question_terms[i]) / len(query_terms))
+            for i in top if scores[i] > 0 and scores[i] >= threshold
+        ]
@@ -1,13 +1,19 @@
+import asyncio
 from typing import Literal, Optional
 from typing_extensions import Annotated, TypedDict
 from datetime import datetime, date
-from enum import Enum
 from pydantic import BaseModel, Field, ConfigDict
-import requests
 import json
-from langchain_openai import ChatOpenAI
 from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.output_parsers import JsonOutputParser
+import limits
+from http_client import BOOKING_API_BASE_URL, BackendClient, backend_client
+from invalidation import tables_changed
+from availability import AVAILABILITY_INDEX, availability
+from time_slots import TimeSlot
+from lazy import lazy
+from tracing import traced
+from llm_registry import llm_registry
 
 # Custom JSON Encoder to handle date serialization
 class CustomJSONEncoder(json.JSONEncoder):
@@ -17,14 +23,6 @@ class CustomJSONEncoder(json.JSONEncoder):
         return super().default(obj)
 
 # API Models
-class TimeSlot(str, Enum):
-    SLOT_7_TO_8 = "7am to 8am"
-    SLOT_8_TO_9 = "8am to 9am"
-    SLOT_9_TO_10 = "9am to 10am"
-    SLOT_13_TO_14 = "1pm to 2pm"
-    SLOT_14_TO_15 = "2pm to 3pm"
-    SLOT_15_TO_16 = "3pm to 4pm"
-
 class BookAppointmentRequest(BaseModel):
     model_config = ConfigDict(arbitrary_types_allowed=True)
     
@@ -57,37 +55,84 @@ class ActionOutput(BaseModel):
     action: Literal["book_appointment", "cancel_appointment", "missing_info"]
     parameters: dict
 
+def _book_request(params: dict) -> BookAppointmentRequest:
+    return BookAppointmentRequest(
+        doctorId=params['doctorId'],
+        patientId=params['patientId'],
+        appointmentDate=datetime.strptime(params['appointmentDate'], "%Y-%m-%d").date(),
+        timeSlot=TimeSlot(params['timeSlot'])
+        # timeSlot=TimeSlot.SLOT_7_TO_8
+    )
+
+# Tables a successful book or cancel call writes to
+APPOINTMENT_TABLES = ("appointment",)
+
+def _booking_conflict(request: BookAppointmentRequest) -> Optional[str]:
+    """Failure message if the availability index knows the slot is taken; None lets the backend decide."""
+    if not AVAILABILITY_INDEX:
+        return None
+    try:
+        if not availability.is_booked(request.doctorId, request.appointmentDate, request.timeSlot.name):
+            return None
+        free = availability.free_slots(request.doctorId, request.appointmentDate)
+    except Exception as e:
+        print(f"Availability pre-check skipped: {e}")
+        return None
+    message = f"**Action failed**: Doctor {request.doctorId} is already booked on {request.appointmentDate.isoformat()}, {request.timeSlot.value}."
+    if free:
+        message += f" Free slots that day: {', '.join(free)}."
+    return message
+
 class EndpointHandler:
-    BASE_URL = "http://localhost:8080/api"
+    # Pooled keep-alive client with timeouts and bounded retries; base URL from BOOKING_API_BASE_URL
+    BASE_URL = BOOKING_API_BASE_URL
+
+    def __init__(self, client: BackendClient = backend_client):
+        self.client = client
+
+    @property
+    def base_url(self) -> str:
+        """The URL this handler's client actually calls (BASE_URL unless given another client)."""
+        return self.client.base_url
     
     def book_appointment(self, params: dict) -> str:
         try:
-            request = BookAppointmentRequest(
-                doctorId=params['doctorId'],
-                patientId=params['patientId'],
-                appointmentDate=datetime.strptime(params['appointmentDate'], "%Y-%m-%d").date(),
-                timeSlot=TimeSlot(params['timeSlot'])
-                # timeSlot=TimeSlot.SLOT_7_TO_8
-            )
+            request = _book_request(params)
             print(request.to_dict())
-            response = requests.post(
-                f"{self.BASE_URL}/appointment/doctor",
-                json=request.to_dict(),
-                headers={'Content-Type': 'application/json'}
-            )
-            return self._handle_response(response)
+            conflict = _booking_conflict(request)
+            if conflict is not None:
+                return conflict
+            response = self.client.post("/appointment/doctor", request.to_dict())
+            return self._handle_booking(request, response)
         except Exception as e:
             return f"Error in booking appointment: {str(e)}"
 
     def cancel_appointment(self, params: dict) -> str:
         try:
             request = CancelAppointmentRequest(**params)
-            response = requests.post(
-                f"{self.BASE_URL}/appointment/cancel", 
-                json=request.to_dict(),
-                headers={'Content-Type': 'application/json'}
-            )
-            return self._handle_response(response)
+            response = self.client.post("/appointment/cancel", request.to_dict())
+            return self._handle_cancellation(request, response)
+        except Exception as e:
+            return f"Error in canceling appointment: {str(e)}"
+
+    async def abook_appointment(self, params: dict) -> str:
+        try:
+            request = _book_request(params)
+            # Checking may reload the availability index, which is sync DB I/O
+            conflict = (await asyncio.to_thread(_booking_conflict, request) if availability.needs_refresh()
+                        else _booking_conflict(request))
+            if conflict is not None:
+                return conflict
+            response = await self.client.apost("/appointment/doctor", request.to_dict())
+            return self._handle_booking(request, response)
+        except Exception as e:
+            return f"Error in booking appointment: {str(e)}"
+
+    async def acancel_appointment(self, params: dict) -> str:
+        try:
+            request = CancelAppointmentRequest(**params)
+            response = await self.client.apost("/appointment/cancel", request.to_dict())
+            return self._handle_cancellation(request, response)
         except Exception as e:
             return f"Error in canceling appointment: {str(e)}"
     
@@ -98,19 +143,45 @@ class EndpointHandler:
     #         "data": response.json()
     #     }
     #     return f"Action failed: {response.json().get('message', 'Unknown error')}"
+    def _handle_booking(self, request: BookAppointmentRequest, response) -> str:
+        if self._handle_write(response):
+            appointment_id = _json_body(response).get("appointmentId")
+            availability.record_booking(request.doctorId, request.appointmentDate, request.timeSlot.name,
+                                        int(appointment_id) if appointment_id is not None else None)
+        return self._handle_response(response)
+
+    def _handle_cancellation(self, request: CancelAppointmentRequest, response) -> str:
+        if self._handle_write(response):
+            availability.record_cancellation(request.appointmentId)
+        return self._handle_response(response)
+
+    def _handle_write(self, response) -> bool:
+        # Cached SQL results and answers about appointments are stale once a write went through,
+        # whatever the body looks like, so this runs before anything parses it
+        succeeded = 200 <= response.status_code < 300
+        if succeeded:
+            tables_changed(APPOINTMENT_TABLES)
+        return succeeded
+
     def _handle_response(self, response) -> str:
-        if response.status_code == 200:
-            data = response.json()
+        data = _json_body(response)
+        if 200 <= response.status_code < 300:
             message = data.get('message', 'Action completed successfully')
             details = "\n".join([f"- **{key}**: {value}" for key, value in data.items()])
             return f"**Message**: {message}\n\n**Details**:\n{details}"
         else:
-            error_message = response.json().get('message', 'Unknown error')
+            error_message = data.get('message', 'Unknown error')
             return f"**Action failed**: {error_message}"
 
-def route_action(question: str) -> ActionOutput:
-    """Route the question to appropriate endpoint action."""
-    routing_prompt = ChatPromptTemplate.from_template("""You are an assistant that determines what endpoint action to take.
+def _json_body(response) -> dict:
+    """The response's JSON object, or {} when the body is empty or not a JSON object."""
+    try:
+        data = response.json()
+    except ValueError:
+        return {}
+    return data if isinstance(data, dict) else {}
+
+ACTION_PROMPT = ChatPromptTemplate.from_template("""You are an assistant that determines what endpoint action to take.
     Available actions:
     1. book_appointment - For booking doctor appointments
     2. cancel_appointment - For canceling existing appointments
@@ -136,8 +207,15 @@ def route_action(question: str) -> ActionOutput:
     
     Respond ONLY with a JSON that includes 'action', 'parameters'""")
 
-    llm = ChatOpenAI(model="gpt-4o-mini", temperature=0)
-    chain = routing_prompt | llm | JsonOutputParser()
+def _action_chain():
+    return llm_registry.chain("action", lambda llm: ACTION_PROMPT | llm | JsonOutputParser(), temperature=0)
+
+lazy("action_chain", _action_chain)
+
+@traced("action_route")
+def route_action(question: str) -> ActionOutput:
+    """Route the question to appropriate endpoint action."""
+    chain = _action_chain()
     
     try:
         result = chain.invoke({"question": question})
@@ -146,10 +224,62 @@ def route_action(question: str) -> ActionOutput:
     except Exception as e:
         raise ValueError(f"Error parsing action: {str(e)}")
 
-def get_function_call_answer(question: str) -> str:
-    """Main entry point for function calling bot."""
+@traced("action_route")
+async def aroute_action(question: str) -> ActionOutput:
+    """Async route_action."""
+    chain = _action_chain()
+
+    try:
+        async with limits.llm:
+            result = await chain.ainvoke({"question": question})
+        print(f"LLM Decision: {result}")
+        return ActionOutput(**result)
+    except Exception as e:
+        raise ValueError(f"Error parsing action: {str(e)}")
+
+### Actions extracted by the combined router (unified_bot, ROUTER_MODE=combined)
+
+REQUIRED_FIELDS = {
+    "book_appointment": ("doctorId", "patientId", "appointmentDate", "timeSlot"),
+    "cancel_appointment": ("appointmentId", "reason"),
+}
+
+ACTION_FIELDS_GUIDE = f"""
+        **When the decision is "function_call"**, also fill in the action and its parameters:
+        - book_appointment: doctorId, patientId, appointmentDate (YYYY-MM-DD), timeSlot (one of: {", ".join(slot.value for slot in TimeSlot)})
+        - cancel_appointment: appointmentId, reason
+        - missing_info: a required detail is not in the question; leave the unknown parameters empty
+        The question may use other words for a field, e.g. 'time slot', 'time' or 'at 8am' for timeSlot.
+        For "sql" and "rag", leave the action and all parameters empty.
+
+"""
+
+def validated_action(action: Optional[str], fields: dict) -> ActionOutput:
+    """ActionOutput checked against the request models; incomplete or invalid requests become missing_info."""
+    required = REQUIRED_FIELDS.get(action)
+    if required is None:
+        # missing_info (or no action): pass on whatever details the question did give
+        known = {field for fields_of_action in REQUIRED_FIELDS.values() for field in fields_of_action}
+        given = {field: value for field, value in fields.items() if field in known and value not in (None, "")}
+        return ActionOutput(action="missing_info", parameters={"missing": "action details", **given})
+    params = {field: fields.get(field) for field in required}
+    missing = [field for field, value in params.items() if value in (None, "")]
+    if missing:
+        given = {field: value for field, value in params.items() if value not in (None, "")}
+        return ActionOutput(action="missing_info", parameters={"missing": missing, **given})
+    try:
+        if action == "book_appointment":
+            _book_request(params)
+        else:
+            CancelAppointmentRequest(**params)
+    except ValueError as e:
+        return ActionOutput(action="missing_info", parameters={"invalid": str(e), **params})
+    return ActionOutput(action=action, parameters=params)
+
+def get_function_call_answer(question: str, action: Optional[ActionOutput] = None) -> str:
+    """Main entry point for function calling bot. A given action skips the extraction LLM call."""
     try:
-        action = route_action(question)
+        action = action or route_action(question)
         handler = EndpointHandler()
         
         if action.action == "book_appointment":
@@ -161,6 +291,22 @@ def get_function_call_answer(question: str) -> str:
             
     except Exception as e:
         return f"Error handling function call: {str(e)}"
+
+async def aget_function_call_answer(question: str, action: Optional[ActionOutput] = None) -> str:
+    """Async get_function_call_answer."""
+    try:
+        action = action or await aroute_action(question)
+        handler = EndpointHandler()
+
+        if action.action == "book_appointment":
+            return await handler.abook_appointment(action.parameters)
+        elif action.action == "cancel_appointment":
+            return await handler.acancel_appointment(action.parameters)
+        else:
+            return f"Missing information: {action.parameters}"
+
+    except Exception as e:
+        return f"Error handling function call: {str(e)}"
     
 # Example usage
 # if __name__ == "__main__":
@@ -0,0 +1,134 @@
+import os
+import threading
+import time
+from typing import Dict
+
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import limits
+from metrics import Histogram
+from tracing import traced
+
+
+### Appointment backend client
+# One pooled client per process instead of a fresh TCP connection per booking. Connections
+# are kept alive, every call has connect and read timeouts, and retries are bounded: POSTs
+# are only retried when the connection could not be made (the request never reached the
+# backend), idempotent methods also on 502/503/504 and read errors.
+
+BOOKING_API_BASE_URL = os.getenv("BOOKING_API_BASE_URL", "http://localhost:8080/api")
+BACKEND_CONNECT_TIMEOUT = float(os.getenv("BACKEND_CONNECT_TIMEOUT", "2"))
+BACKEND_READ_TIMEOUT = float(os.getenv("BACKEND_READ_TIMEOUT", "10"))
+BACKEND_RETRIES = int(os.getenv("BACKEND_RETRIES", "2"))
+BACKEND_POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", str(limits.backend.limit)))
+
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+class EndpointMetrics:
+    def __init__(self):
+        self.latency_seconds = Histogram()
+        self.requests = 0
+        self.errors = 0
+
+
+class BackendClient:
+    def __init__(self, base_url: str = BOOKING_API_BASE_URL,
+                 connect_timeout: float = BACKEND_CONNECT_TIMEOUT, read_timeout: float = BACKEND_READ_TIMEOUT,
+                 retries: int = BACKEND_RETRIES, pool_size: int = BACKEND_POOL_SIZE):
+        self.base_url = base_url.rstrip("/")
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.pool_size = pool_size
+        self._session = None
+        self._async_client = None
+        self._lock = threading.Lock()
+        self._metrics: Dict[str, EndpointMetrics] = {}
+
+    @property
+    def session(self) -> requests.Session:
+        if self._session is None:
+            with self._lock:
+                if self._session is None:
+                    retry = Retry(
+                        total=self.retries, connect=self.retries, read=self.retries, status=self.retries,
+                        status_forcelist=(502, 503, 504), allowed_methods=Retry.DEFAULT_ALLOWED_METHODS,
+                        backoff_factor=0.2, raise_on_status=False,
+                    )
+                    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=retry)
+                    session = requests.Session()
+                    session.mount("http://", adapter)
+                    session.mount("https://", adapter)
+                    self._session = session
+        return self._session
+
+    @property
+    def async_client(self) -> httpx.AsyncClient:
+        if self._async_client is None:
+            self._async_client = httpx.AsyncClient(
+                # httpx transport retries cover connection failures only, which is safe for POST
+                transport=httpx.AsyncHTTPTransport(retries=self.retries),
+                timeout=httpx.Timeout(self.timeout[1], connect=self.timeout[0]),
+                limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            )
+        return self._async_client
+
+    @traced("backend_call")
+    def post(self, path: str, payload: dict) -> requests.Response:
+        start = time.perf_counter()
+        try:
+            response = self.session.post(f"{self.base_url}{path}", json=payload, headers=JSON_HEADERS,
+                                         timeout=self.timeout)
+        except requests.RequestException:
+            self._record(path, start, error=True)
+            raise
+        self._record(path, start, error=response.status_code >= 500)
+        return response
+
+    @traced("backend_call")
+    async def apost(self, path: str, payload: dict) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            async with limits.backend:
+                response = await self.async_client.post(f"{self.base_url}{path}", json=payload, headers=JSON_HEADERS)
+        except httpx.HTTPError:
+            self._record(path, start, error=True)
+            raise
+        self._record(path, start, error=response.status_code >= 500)
+        return response
+
+    def close(self):
+        if self._session is not None:
+            self._session.close()
+            self._session = None
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+
+    def stats(self) -> dict:
+        return {
+            path: {
+                "requests": metrics.requests,
+                "errors": metrics.errors,
+                "p50_seconds": metrics.latency_seconds.quantile(0.5),
+                "p95_seconds": metrics.latency_seconds.quantile(0.95),
+                "latency_seconds": metrics.latency_seconds.snapshot(),
+            }
+            for path, metrics in list(self._metrics.items())
+        }
+
+    def _record(self, path: str, start: float, error: bool):
+        metrics = self._metrics.get(path)
+        if metrics is None:
+            metrics = self._metrics.setdefault(path, EndpointMetrics())
+        metrics.latency_seconds.observe(time.perf_counter() - start)
+        metrics.requests += 1
+        metrics.errors += int(error)
+
+
+backend_client = BackendClient()
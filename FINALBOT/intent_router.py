@@ -0,0 +1,197 @@
+import os
+import re
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from rag_bot import faqs
+from text_utils import tokenize
+
+
+### Local intent router
+# Most traffic is obvious (greetings, FAQ phrasing, "book ... doctor ID ... patient ID"), so we
+# try to route locally before paying for the router LLM call: keyword rules first, then a
+# small TF-IDF + logistic regression model trained at import from the labelled examples below.
+# Only decisions under ROUTER_CONFIDENCE_THRESHOLD fall back to the LLM.
+
+ROUTER_CONFIDENCE_THRESHOLD = float(os.getenv("ROUTER_CONFIDENCE_THRESHOLD", "0.75"))
+
+SYSTEMS = ["sql", "rag", "function_call"]
+
+LABELLED_EXAMPLES: List[Tuple[str, str]] = [
+    # sql: data lookups
+    ("List my appointments. My patient ID is 10.", "sql"),
+    ("Show all doctors along with their departments and IDs.", "sql"),
+    ("Are there any doctors available this Monday at 7 AM?", "sql"),
+    ("What free slots are available for appointments this week?", "sql"),
+    ("List doctors in cardiology", "sql"),
+    ("Which doctors work in the pediatrics department?", "sql"),
+    ("How many appointments do we have today?", "sql"),
+    ("Show my upcoming appointments, patient ID 4", "sql"),
+    ("What is the schedule of doctor ID 3 on Friday?", "sql"),
+    ("Is doctor 2 free tomorrow at 8am?", "sql"),
+    ("List all departments", "sql"),
+    ("How many patients are registered?", "sql"),
+    ("Show the medical bills for patient ID 7", "sql"),
+    ("What are the working days of doctor Nguyen?", "sql"),
+    ("Which doctor has the most appointments this month?", "sql"),
+    ("Find a free doctor on Monday morning", "sql"),
+    ("What time slots are still open for doctor ID 5 next Tuesday?", "sql"),
+    ("List all patients with their name", "sql"),
+    ("Show my examination details, my patient id is 12", "sql"),
+    ("Who is the head of the surgery department?", "sql"),
+    ("Could I book appointment on this Monday 7am, is there any free doctor?", "sql"),
+    ("Count the appointments per department", "sql"),
+    # rag: general information and conversation
+    ("Hi", "rag"),
+    ("Hello", "rag"),
+    ("How are you?", "rag"),
+    ("My name is Lan", "rag"),
+    ("Good morning", "rag"),
+    ("Thank you", "rag"),
+    ("Can I visit the hospital on weekends?", "rag"),
+    ("Is there parking available at the hospital?", "rag"),
+    ("What is the earliest time I can book an appointment?", "rag"),
+    ("Can I book an appointment without using the website?", "rag"),
+    ("How long does a typical consultation last?", "rag"),
+    ("What should I bring to my appointment?", "rag"),
+    ("Are walk-in appointments available?", "rag"),
+    ("What happens if I miss my appointment?", "rag"),
+    ("Can I get a refund if I cancel my appointment?", "rag"),
+    ("Do you offer any discounts for senior citizens?", "rag"),
+    ("What languages are spoken by the staff?", "rag"),
+    ("Is there a pharmacy on-site?", "rag"),
+    ("Could I book an appointment at 10pm?", "rag"),
+    # function_call: state-changing actions
+    ("Book an appointment on 2024-11-20 at 4 PM with doctor ID 1 for patient ID 1.", "function_call"),
+    ("Book an appointment with doctor ID 1 for patient 1 at 2024-11-20 at 1pm to 2pm", "function_call"),
+    ("Change my appointment to 2024-11-20 at 4 PM with doctor ID 1 for patient ID 1.", "function_call"),
+    ("Update my password to '123456'.", "function_call"),
+    ("Cancel appointment ID 15 because I am sick", "function_call"),
+    ("Please cancel my appointment 42, reason: travelling", "function_call"),
+    ("Schedule patient 3 with doctor 2 on 2024-12-01 from 8am to 9am", "function_call"),
+    ("Reserve 9am to 10am on 2024-12-02 with doctor ID 4 for patient ID 9", "function_call"),
+    ("Book doctor 5 for patient 8 tomorrow 2pm to 3pm", "function_call"),
+    ("I want to book doctor ID 2 for patient ID 6 on 2025-01-10 at 7am", "function_call"),
+    ("Cancel my booking with appointment id 7, I feel better now", "function_call"),
+    ("Reschedule appointment 11 to 2024-11-22 at 3pm", "function_call"),
+] + [(question, "rag") for question in faqs]
+
+
+### Keyword rules, checked before the model
+
+_GREETING = re.compile(r"^(hi|hello|hey|good (morning|afternoon|evening)|thanks?( you)?|how are you|my name is)\b", re.I)
+_ID_MENTION = re.compile(r"\b(doctor|patient|appointment)\s*(id)?\s*[:#=]?\s*\d+", re.I)
+_CANCEL_BY_ID = re.compile(r"\bcancel\b.*\bappointment\s*(id)?\s*[:#=]?\s*\d+", re.I)
+_DATE = re.compile(r"\b\d{4}-\d{2}-\d{2}\b")
+# Actions are asked for as requests: the verb first, or after "please" / "can you" / "I want to"
+_REQUEST_FORM = re.compile(
+    r"^\s*(please\s+|kindly\s+|(can|could|would|will)\s+you\s+(please\s+)?|i\s*(want|need|would like|'d like)\s+to\s+)?"
+    r"(book|schedule|reserve|cancel|reschedule|change|update)\b", re.I)
+# "Did patient 5 cancel appointment 7?" reads data even though it names an action and IDs
+_READ_QUESTION = re.compile(r"^\s*(did|does|do|which|how many|what|when|was|were|who|has|have)\b", re.I)
+# Local confidence for a function_call guess on a read question: below the threshold, the LLM decides
+READ_QUESTION_CONFIDENCE = 0.5
+
+def _rule(question: str) -> Optional[Tuple[str, float]]:
+    if _GREETING.match(question.strip()) and len(question.split()) <= 6:
+        return "rag", 0.99
+    if _REQUEST_FORM.match(question) and not _READ_QUESTION.match(question):
+        ids = len(_ID_MENTION.findall(question))
+        if ids >= 2 or (ids >= 1 and _DATE.search(question)) or _CANCEL_BY_ID.search(question):
+            return "function_call", 0.97
+    return None
+
+
+def _features(text: str) -> List[str]:
+    tokens = ["<num>" if token.isdigit() else token for token in tokenize(text)]
+    tokens = ["<date>" if _DATE.fullmatch(token) else token for token in tokens]
+    return tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+
+
+class RouteDecision(NamedTuple):
+    system: str
+    confidence: float
+    source: str  # "rule" or "model"
+
+
+class IntentRouter:
+    def __init__(self, examples: List[Tuple[str, str]], threshold: float = ROUTER_CONFIDENCE_THRESHOLD,
+                 epochs: int = 300, learning_rate: float = 2.0, l2: float = 1e-3):
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.counts: Dict[str, int] = {"rule": 0, "model": 0, "llm": 0}
+        self.local_seconds = 0.0
+        self._train(examples, epochs, learning_rate, l2)
+
+    def _train(self, examples, epochs, learning_rate, l2):
+        documents = [_features(text) for text, _ in examples]
+        self.vocabulary = {term: i for i, term in enumerate(sorted({t for doc in documents for t in doc}))}
+        document_frequency = np.zeros(len(self.vocabulary))
+        for doc in documents:
+            document_frequency[[self.vocabulary[t] for t in set(doc)]] += 1
+        self.idf = np.log((1 + len(documents)) / (1 + document_frequency)) + 1
+
+        X = np.vstack([self._vectorize(doc) for doc in documents])
+        y = np.array([SYSTEMS.index(label) for _, label in examples])
+        Y = np.eye(len(SYSTEMS))[y]
+        self.weights = np.zeros((X.shape[1], len(SYSTEMS)))
+        self.bias = np.zeros(len(SYSTEMS))
+        for _ in range(epochs):
+            probabilities = self._softmax(X @ self.weights + self.bias)
+            gradient = probabilities - Y
+            self.weights -= learning_rate * (X.T @ gradient / len(X) + l2 * self.weights)
+            self.bias -= learning_rate * gradient.mean(axis=0)
+
+    def _vectorize(self, terms: List[str]) -> np.ndarray:
+        vector = np.zeros(len(self.vocabulary))
+        for term in terms:
+            index = self.vocabulary.get(term)
+            if index is not None:
+                vector[index] += 1
+        vector *= self.idf
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    @staticmethod
+    def _softmax(scores: np.ndarray) -> np.ndarray:
+        scores = scores - scores.max(axis=-1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=-1, keepdims=True)
+
+    def classify(self, question: str) -> RouteDecision:
+        """Local decision with its confidence, whatever the threshold."""
+        rule = _rule(question)
+        if rule:
+            return RouteDecision(rule[0], rule[1], "rule")
+        probabilities = self._softmax(self._vectorize(_features(question)) @ self.weights + self.bias)
+        best = int(probabilities.argmax())
+        confidence = float(probabilities[best])
+        if SYSTEMS[best] == "function_call" and _READ_QUESTION.match(question):
+            confidence = min(confidence, READ_QUESTION_CONFIDENCE)
+        return RouteDecision(SYSTEMS[best], confidence, "model")
+
+    def decide(self, question: str) -> Optional[RouteDecision]:
+        """Confident local decision, or None when the LLM router should decide."""
+        start = time.perf_counter()
+        decision = self.classify(question)
+        elapsed = time.perf_counter() - start
+        source = decision.source if decision.confidence >= self.threshold else "llm"
+        with self._lock:
+            self.counts[source] += 1
+            self.local_seconds += elapsed
+        return decision if source != "llm" else None
+
+    def stats(self) -> dict:
+        total = sum(self.counts.values())
+        return {
+            "counts": dict(self.counts),
+            "local_rate": (total - self.counts["llm"]) / total if total else 0.0,
+            "avg_local_ms": self.local_seconds / total * 1000 if total else 0.0,
+            "threshold": self.threshold,
+        }
+
+
+intent_router = IntentRouter(LABELLED_EXAMPLES)
@@ -0,0 +1,50 @@
+import threading
+from typing import Callable, Dict, FrozenSet, Iterable, List
+
+
+### Table change notifications
+# Caches holding data read from the clinic database subscribe here; code that writes through
+# the booking API publishes the tables it changed once the write succeeded, so nothing we
+# cached stays stale after our own writes.
+# Invalidation alone misses reads that were in flight: a SELECT that started before a booking
+# and finishes after it would store the old rows. Every change therefore advances a clock and
+# stamps the tables it touched; readers take generation() before reading and caches refuse a
+# put when changed_since() says one of its tables moved in between.
+
+_subscribers: List[Callable[[FrozenSet[str]], object]] = []
+_lock = threading.Lock()
+_clock = 0
+_changed_at: Dict[str, int] = {}
+
+
+def on_tables_changed(callback: Callable[[FrozenSet[str]], object]):
+    """Register callback(tables) for every published change; usable as a decorator."""
+    with _lock:
+        _subscribers.append(callback)
+    return callback
+
+
+def generation() -> int:
+    """The change clock; take it before reading data that will be cached."""
+    return _clock
+
+
+def changed_since(tables: Iterable[str], since: int) -> bool:
+    """Whether any of the tables changed after generation() returned since."""
+    return any(_changed_at.get(table, 0) > since for table in tables)
+
+
+def tables_changed(tables: Iterable[str]):
+    """Tell every subscriber that these tables were written to."""
+    global _clock
+    tables = frozenset(tables)
+    # Stamped before the subscribers run, so a put racing with them is refused or evicted
+    with _lock:
+        _clock += 1
+        for table in tables:
+            _changed_at[table] = _clock
+    for callback in list(_subscribers):
+        try:
+            callback(tables)
+        except Exception as e:
+            print(f"Invalidation of {sorted(tables)} failed in {getattr(callback, '__qualname__', callback)}: {e}")
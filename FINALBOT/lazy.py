@@ -0,0 +1,75 @@
+import threading
+import time
+from typing import Callable, Dict, Generic, Iterable, Optional, TypeVar
+
+
+### Lazily built components
+# Database connections, LLM clients and prompts used to be created at import, so every worker
+# paid for them (and needed MySQL, OpenAI and the prompt hub reachable) before serving a
+# request. Each one is now a Lazy built on first use; server startup can warm them all up
+# front (WARMUP_ON_STARTUP) and /ready reports which are warm.
+
+T = TypeVar("T")
+
+_components: Dict[str, "Lazy"] = {}
+
+
+class Lazy(Generic[T]):
+    def __init__(self, name: str, factory: Callable[[], T]):
+        self.name = name
+        self.factory = factory
+        self._value: Optional[T] = None
+        self._ready = False
+        self._lock = threading.Lock()
+        self.init_seconds: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def get(self) -> T:
+        if self._ready:
+            return self._value
+        with self._lock:
+            if not self._ready:
+                start = time.perf_counter()
+                try:
+                    self._value = self.factory()
+                except Exception as e:
+                    self.error = f"{type(e).__name__}: {e}"
+                    raise
+                self.init_seconds = time.perf_counter() - start
+                self.error = None
+                self._ready = True
+        return self._value
+
+    @property
+    def ready(self) -> bool:
+        return self._ready
+
+    def reset(self):
+        """Forget the value; the next get() builds it again."""
+        with self._lock:
+            self._value = None
+            self._ready = False
+
+    def stats(self) -> dict:
+        return {"warm": self._ready, "init_seconds": self.init_seconds, "error": self.error}
+
+
+def lazy(name: str, factory: Callable[[], T]) -> Lazy[T]:
+    """Create a named lazy component and register it for warmup and readiness."""
+    component = Lazy(name, factory)
+    _components[name] = component
+    return component
+
+
+def warm_up(names: Optional[Iterable[str]] = None) -> Dict[str, dict]:
+    """Build the given components (all registered ones by default); failures are recorded, not raised."""
+    for name in names if names is not None else list(_components):
+        try:
+            _components[name].get()
+        except Exception:
+            pass
+    return readiness()
+
+
+def readiness() -> Dict[str, dict]:
+    return {name: component.stats() for name, component in _components.items()}
@@ -0,0 +1,42 @@
+import asyncio
+import os
+
+
+### Concurrency limits for the async request path
+# One uvicorn worker can hold hundreds of in-flight conversations; these caps keep it from
+# opening more LLM calls, DB queries or backend calls at once than the upstreams can take.
+
+class ConcurrencyLimit:
+    """Async context manager around a semaphore, created lazily on the running loop."""
+
+    def __init__(self, name: str, limit: int):
+        self.name = name
+        self.limit = limit
+        self.in_flight = 0
+        self.peak = 0
+        self._semaphore = None
+        self._loop = None
+
+    async def __aenter__(self):
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.limit)
+            self._loop = loop
+        await self._semaphore.acquire()
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    def stats(self) -> dict:
+        return {"limit": self.limit, "in_flight": self.in_flight, "peak": self.peak}
+
+
+llm = ConcurrencyLimit("llm", int(os.getenv("LLM_MAX_CONCURRENCY", "64")))
+db = ConcurrencyLimit("db", int(os.getenv("DB_MAX_CONCURRENCY", "20")))
+backend = ConcurrencyLimit("backend", int(os.getenv("BACKEND_MAX_CONCURRENCY", "20")))
+# Questions of /chat/batch requests answered at once, shared by all batches in the worker
+batch = ConcurrencyLimit("batch", int(os.getenv("BATCH_MAX_CONCURRENCY", "16")))
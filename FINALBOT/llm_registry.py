@@ -0,0 +1,152 @@
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, Tuple
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+from metrics import Histogram
+
+
+### Shared LLM clients
+# Every bot asks the registry for its chat model instead of constructing ChatOpenAI itself.
+# Clients are keyed by model and constructor parameters and built once; structured-output
+# wrappers and chains built on top of them are cached too. Each model gets a callback handler
+# counting calls, errors, tokens and latency.
+
+DEFAULT_MODEL = os.getenv("LLM_MODEL", "gpt-4o-mini")
+
+
+class LLMCallMetrics(BaseCallbackHandler):
+    """Per-model call counts, token usage and latency, fed by LangChain callbacks."""
+
+    # Called inline from async runs too, instead of from an executor thread
+    run_inline = True
+
+    def __init__(self, model: str):
+        self.model = model
+        self.latency = Histogram()
+        self.calls = 0
+        self.errors = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self._started: Dict[Any, float] = {}
+        self._lock = threading.Lock()
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs):
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_end(self, response, *, run_id, **kwargs):
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        self._finish(run_id, error=False, usage=usage)
+
+    def on_llm_error(self, error, *, run_id, **kwargs):
+        self._finish(run_id, error=True, usage={})
+
+    def _finish(self, run_id, error: bool, usage: dict):
+        start = self._started.pop(run_id, None)
+        if start is not None:
+            self.latency.observe(time.perf_counter() - start)
+        with self._lock:
+            self.calls += 1
+            self.errors += error
+            self.prompt_tokens += usage.get("prompt_tokens") or 0
+            self.completion_tokens += usage.get("completion_tokens") or 0
+
+    def stats(self) -> dict:
+        return {
+            "calls": self.calls,
+            "errors": self.errors,
+            "prompt_tokens": self.prompt_tokens,
+            "completion_tokens": self.completion_tokens,
+            "latency_p50_seconds": self.latency.quantile(0.5),
+            "latency_p95_seconds": self.latency.quantile(0.95),
+            "latency": self.latency.snapshot(),
+        }
+
+
+def _chat_openai(**kwargs):
+    from langchain_openai import ChatOpenAI
+    return ChatOpenAI(**kwargs)
+
+
+class LLMRegistry:
+    def __init__(self, factory: Callable[..., Any] = _chat_openai):
+        self.factory = factory
+        self._clients: Dict[Tuple, Any] = {}
+        self._structured: Dict[Tuple, Any] = {}
+        self._chains: Dict[Tuple, Any] = {}
+        self._metrics: Dict[str, LLMCallMetrics] = {}
+        self._lock = threading.RLock()
+
+    @staticmethod
+    def _key(model: str, params: dict) -> Tuple:
+        return (model,) + tuple(sorted(params.items()))
+
+    def client(self, model: str = DEFAULT_MODEL, **params):
+        """The shared chat model for these constructor parameters."""
+        key = self._key(model, params)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    client = self.factory(model=model, callbacks=[self.metrics(model)], **params)
+                    self._clients[key] = client
+        return client
+
+    def structured(self, schema, model: str = DEFAULT_MODEL, **params):
+        """Cached client.with_structured_output(schema)."""
+        key = (schema,) + self._key(model, params)
+        runnable = self._structured.get(key)
+        if runnable is None:
+            with self._lock:
+                runnable = self._structured.get(key)
+                if runnable is None:
+                    runnable = self.client(model, **params).with_structured_output(schema)
+                    self._structured[key] = runnable
+        return runnable
+
+    def chain(self, name: Hashable, build: Callable[[Any], Any], model: str = DEFAULT_MODEL, **params):
+        """Cached chain build(client), e.g. prompt | llm | parser, under a caller-chosen name."""
+        key = (name,) + self._key(model, params)
+        chain = self._chains.get(key)
+        if chain is None:
+            with self._lock:
+                chain = self._chains.get(key)
+                if chain is None:
+                    chain = build(self.client(model, **params))
+                    self._chains[key] = chain
+        return chain
+
+    def metrics(self, model: str) -> LLMCallMetrics:
+        with self._lock:
+            if model not in self._metrics:
+                self._metrics[model] = LLMCallMetrics(model)
+            return self._metrics[model]
+
+    def set_factory(self, factory: Callable[..., Any]):
+        """Swap the client constructor (e.g. a fake model for benchmarks) and drop cached clients."""
+        with self._lock:
+            self.factory = factory
+            self.clear()
+
+    def clear(self):
+        with self._lock:
+            self._clients.clear()
+            self._structured.clear()
+            self._chains.clear()
+
+    def stats(self) -> dict:
+        return {
+            "clients": len(self._clients),
+            "structured": len(self._structured),
+            "chains": len(self._chains),
+            "models": {model: metrics.stats() for model, metrics in self._metrics.items()},
+        }
+
+
+llm_registry = LLMRegistry()
@@ -0,0 +1,102 @@
+import bisect
+import threading
+from typing import Sequence
+
+
+### Metrics primitives
+
+# Seconds; spans sub-millisecond pool checkouts up to slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+class Histogram:
+    """Fixed-bucket histogram (Prometheus style: cumulative buckets, sum and count)."""
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0.0
+        self._count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value: float):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += value
+            self._count += 1
+
+    def quantile(self, q: float) -> float:
+        """Upper bound of the bucket holding the q-quantile (0 when empty)."""
+        with self._lock:
+            if not self._count:
+                return 0.0
+            rank = q * self._count
+            seen = 0
+            for bound, count in zip(self.buckets + (float("inf"),), self._counts):
+                seen += count
+                if seen >= rank:
+                    return bound
+        return float("inf")
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            cumulative = []
+            seen = 0
+            for count in self._counts:
+                seen += count
+                cumulative.append(seen)
+            return {
+                "buckets": dict(zip(self.buckets + (float("inf"),), cumulative)),
+                "sum": self._sum,
+                "count": self._count,
+            }
+
+
+### Prometheus text exposition
+# Subsystems report plain stats() dicts. Each (prefix, stats, label) section is flattened:
+# numbers and bools become gauges named prefix_key, Histogram snapshots become histograms,
+# nested dicts extend the name, and everything else (strings, lists, None) is skipped. With a
+# label, the section's top-level keys are label values (e.g. model="gpt-4o-mini").
+
+def _is_snapshot(value) -> bool:
+    return isinstance(value, dict) and value.keys() == {"buckets", "sum", "count"}
+
+
+def _label_text(labels: dict, extra: str = "") -> str:
+    parts = [f'{name}="{str(value)}"' for name, value in labels.items()]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _flatten(families: dict, name: str, value, labels: dict):
+    if _is_snapshot(value):
+        lines = families.setdefault(name, ("histogram", []))[1]
+        for bound, count in value["buckets"].items():
+            le = "+Inf" if float(bound) == float("inf") else repr(float(bound))
+            bucket_labels = _label_text(labels, f'le="{le}"')
+            lines.append(f"{name}_bucket{bucket_labels} {count}")
+        lines.append(f"{name}_sum{_label_text(labels)} {value['sum']}")
+        lines.append(f"{name}_count{_label_text(labels)} {value['count']}")
+    elif isinstance(value, dict):
+        for key, item in value.items():
+            _flatten(families, f"{name}_{key}", item, labels)
+    elif isinstance(value, (bool, int, float)):
+        families.setdefault(name, ("gauge", []))[1].append(f"{name}{_label_text(labels)} {float(value)}")
+
+
+def prometheus_text(sections) -> str:
+    """Render (prefix, stats dict, label name or None) sections in the Prometheus text format."""
+    families = {}
+    for prefix, stats, label in sections:
+        if label is None:
+            _flatten(families, prefix, stats, {})
+        else:
+            for label_value, item in stats.items():
+                _flatten(families, prefix, item, {label: label_value})
+    lines = []
+    for name, (kind, samples) in families.items():
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,63 @@
+import threading
+import time
+from typing import Callable, Dict, List
+
+from langgraph.graph import START, StateGraph
+
+
+### Pipeline registry
+# Each bot registers its LangGraph pipelines (and named variants) here. Graphs are compiled
+# once, at startup, and the compiled graph is shared by every request: it holds no per-run
+# state, so concurrent invoke/stream calls on it are safe.
+
+class PipelineRegistry:
+    def __init__(self):
+        self._specs: Dict[str, tuple] = {}
+        self._graphs: Dict[str, object] = {}
+        self._lock = threading.Lock()
+        self.compile_seconds: Dict[str, float] = {}
+
+    def register(self, name: str, state_type, nodes: List[Callable]):
+        """Register a sequential pipeline; it is compiled by compile_all() or on first use.
+
+        Nodes are functions or (name, runnable) pairs, as accepted by StateGraph.add_sequence.
+        """
+        with self._lock:
+            self._specs[name] = (state_type, nodes)
+            self._graphs.pop(name, None)
+
+    def compile_all(self) -> Dict[str, float]:
+        """Compile every registered pipeline. Returns compile time per pipeline in seconds."""
+        for name in list(self._specs):
+            self.get(name)
+        return dict(self.compile_seconds)
+
+    def get(self, name: str):
+        graph = self._graphs.get(name)
+        if graph is not None:
+            return graph
+        with self._lock:
+            if name not in self._graphs:
+                if name not in self._specs:
+                    raise KeyError(f"Unknown pipeline: {name}")
+                self._graphs[name] = self._compile(name)
+            return self._graphs[name]
+
+    def names(self) -> List[str]:
+        return list(self._specs)
+
+    def stats(self) -> dict:
+        return {"compiled": sorted(self._graphs), "compile_seconds": dict(self.compile_seconds)}
+
+    def _compile(self, name: str):
+        state_type, nodes = self._specs[name]
+        start = time.perf_counter()
+        graph_builder = StateGraph(state_type).add_sequence(nodes)
+        first = nodes[0]
+        graph_builder.add_edge(START, first[0] if isinstance(first, tuple) else first.__name__)
+        graph = graph_builder.compile()
+        self.compile_seconds[name] = time.perf_counter() - start
+        return graph
+
+
+pipelines = PipelineRegistry()
@@ -1,6 +1,12 @@
-
-from langchain_openai import ChatOpenAI
+import os
+from typing import AsyncIterator, List, Optional, Tuple
 from dotenv import load_dotenv
+from faq_index import FAQIndex, FAQMatch
+from text_utils import estimate_tokens
+import limits
+from lazy import lazy
+from tracing import span, traced
+from llm_registry import llm_registry
 
 #### faqs.py
 bot_job = """You are ClinicBot, a helpful assistant for our medical clinic chat system. You can answer questions about our services. 
@@ -44,41 +50,114 @@ faqs = {
 }
 
 ### retrieve.py
+# Minimum normalized BM25 score for an FAQ to count as the answer to the question
+FAQ_MATCH_THRESHOLD = float(os.getenv("FAQ_MATCH_THRESHOLD", "0.55"))
+# ...and only if the FAQ question covers most of what was asked ("book at 10pm" is not the
+# generic booking FAQ) and it clearly beats the runner-up ("where is the hospital" is as close
+# to "contact the hospital" as to "where is the hospital located"). Weaker matches get the
+# selected context instead of a single forced answer.
+FAQ_MATCH_MIN_COVERAGE = float(os.getenv("FAQ_MATCH_MIN_COVERAGE", "0.75"))
+FAQ_MATCH_MARGIN = float(os.getenv("FAQ_MATCH_MARGIN", "0.1"))
+
+faq_index = FAQIndex(faqs)
+
+@traced("faq_retrieval")
+def retrieve_faqs(question: str, k: int = 3, threshold: float = 0.0) -> List[FAQMatch]:
+    """Top-k FAQ matches with scores, best first."""
+    return faq_index.search(question, k=k, threshold=threshold)
+
 def retrieve_faq(question: str) -> str:
-    question = question.lower()
-    for faq_question in faqs:
-        if faq_question in question:
-            return faqs[faq_question]
-    return None
+    matches = retrieve_faqs(question, k=2)
+    if not matches:
+        return None
+    best = matches[0]
+    runner_up = matches[1].score if len(matches) > 1 else 0.0
+    if (best.score < FAQ_MATCH_THRESHOLD or best.coverage < FAQ_MATCH_MIN_COVERAGE
+            or best.score - runner_up < FAQ_MATCH_MARGIN):
+        return None
+    return best.answer
 
 ### generation.py
 load_dotenv()
 
-llm = ChatOpenAI(model="gpt-4o-mini")
+def get_llm():
+    return llm_registry.client()
 
-def generate_response(retrieved_faq: str, question: str) -> str:
+lazy("rag_llm", get_llm)
 
-    context = "Available hospital information:\n" + "\n".join([
-        f"- {value}" for value in faqs.values()
-    ])
+# Prompt templates are built once; only the question and the selected passages vary per call
+RAG_CONTEXT_K = int(os.getenv("RAG_CONTEXT_K", "4"))
+RAG_CONTEXT_TOKEN_BUDGET = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", "300"))
 
-    if retrieved_faq:
-        prompt = f"Q: {question}\nA: {retrieved_faq}\n\nIf the above answer does not fully address the question, please provide a more detailed response."
-    
-    else:
-        prompt = f"""Context: {context}
+MATCHED_PROMPT = "Q: {question}\nA: {retrieved_faq}\n\nIf the above answer does not fully address the question, please provide a more detailed response."
+
+CONTEXT_PROMPT = """Context: Available hospital information:
+{context}
 
             Based on the above information, please answer:
             Q: {question}
             Please provide a clearly brief and helpful response in using the context provided.
             If the question cannot be answered with the available information, politely say so."""
 
+# Passages are formatted once, with their token cost
+_passages = {question: (f"- {answer}", estimate_tokens(answer) + 2) for question, answer in faqs.items()}
+
+def select_context(question: str, k: int = RAG_CONTEXT_K, token_budget: int = RAG_CONTEXT_TOKEN_BUDGET) -> str:
+    """The most relevant FAQ passages for the question that fit in the token budget."""
+    lines = []
+    used = 0
+    for match in retrieve_faqs(question, k=k):
+        line, tokens = _passages[match.question]
+        if used + tokens > token_budget:
+            continue
+        lines.append(line)
+        used += tokens
+    return "\n".join(lines) if lines else "- (no matching hospital information)"
+
+def _rag_prompt(retrieved_faq: str, question: str) -> str:
+    if retrieved_faq:
+        return MATCHED_PROMPT.format(question=question, retrieved_faq=retrieved_faq)
+    return CONTEXT_PROMPT.format(context=select_context(question), question=question)
+
+@traced("rag_generate")
+def generate_response(retrieved_faq: str, question: str) -> str:
     try:
-        response = llm.invoke(prompt)
+        response = get_llm().invoke(_rag_prompt(retrieved_faq, question))
         return response.content.strip()  # Return only the answer content
     except Exception as e:
         return f"Failed to generate response: {e}"
+
+def rag_prompt(question: str) -> str:
+    """The full generation prompt for the question (FAQ retrieval and context selection included)."""
+    return _rag_prompt(retrieve_faq(question), question)
+
+@traced("rag_generate")
+async def agenerate_from_prompt(prompt: str) -> str:
+    try:
+        async with limits.llm:
+            response = await get_llm().ainvoke(prompt)
+        return response.content.strip()
+    except Exception as e:
+        return f"Failed to generate response: {e}"
+
+async def agenerate_response(retrieved_faq: str, question: str) -> str:
+    return await agenerate_from_prompt(_rag_prompt(retrieved_faq, question))
     
+async def astream_from_prompt(prompt: str) -> AsyncIterator[Tuple[str, dict]]:
+    """agenerate_from_prompt as (event, data) pairs: tokens as the LLM produces them, or an error."""
+    started = False
+    try:
+        with span("rag_generate"):
+            async with limits.llm:
+                async for chunk in get_llm().astream(prompt):
+                    text = chunk.content if started else chunk.content.lstrip()
+                    if text:
+                        started = True
+                        yield "token", {"text": text}
+    except Exception as e:
+        # Tokens already sent stay sent; the failure is its own event, never part of the answer
+        yield "error", {"text": f"Failed to generate response: {e}"}
+
 ### rab_model.py
 
 def handle_general_query(question: str) -> str:
@@ -86,10 +165,21 @@ def handle_general_query(question: str) -> str:
     response = generate_response(retrieved_faq, question)
     return response
 
+async def ahandle_general_query(question: str, prompt: Optional[str] = None) -> str:
+    # prompt: already assembled by rag_prompt(), e.g. prefetched while the router decided
+    return await agenerate_from_prompt(prompt if prompt is not None else rag_prompt(question))
+
 ### app_state.py
 def get_rag_answer(question: str) -> str:
     return handle_general_query(question)
 
+async def aget_rag_answer(question: str, prompt: Optional[str] = None) -> str:
+    return await ahandle_general_query(question, prompt)
+
+async def astream_rag_answer(question: str, prompt: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+    async for event, data in astream_from_prompt(prompt if prompt is not None else rag_prompt(question)):
+        yield event, data
+
 # print(get_rag_answer("What are your visiting hours?"))
 
 if __name__ == "__main__":
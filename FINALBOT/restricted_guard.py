@@ -0,0 +1,79 @@
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+### Restricted names in generated answers
+# The restricted table and column names are collected once, tables first (their denial takes
+# precedence), duplicates dropped. Matching is by substring. Each name is looked up with str's
+# C substring search: in CPython that beats a single compiled alternation regex at every list
+# size we measured (bench_restricted_guard.py), since `re` tries each alternative per position.
+# Streams are scanned incrementally over a bounded window (the unreleased tail plus the new
+# chunk), so a guarded answer can be streamed and cut off at the first restricted name.
+
+
+class RestrictedGuard:
+    def __init__(self, restricted_tables: Iterable[str], restricted_columns: Dict[str, List[str]],
+                 table_message: str, column_message: str):
+        names: Dict[str, str] = {}
+        for table in restricted_tables:
+            names.setdefault(table, table_message)
+        for columns in restricted_columns.values():
+            for column in columns:
+                names.setdefault(column, column_message)
+        self._names: Tuple[Tuple[str, str], ...] = tuple(names.items())
+        self.table_message = table_message
+        self.column_message = column_message
+        self.max_name_length = max(map(len, names), default=0)
+
+    def check(self, text: str) -> Optional[str]:
+        """The denial message if the text mentions a restricted name, else None."""
+        for name, message in self._names:
+            if name in text:
+                return message
+        return None
+
+    def guard(self, answer: str) -> str:
+        """The answer, or the denial message if it mentions restricted data."""
+        return self.check(answer) or answer
+
+    def stream(self) -> "GuardedStream":
+        return GuardedStream(self)
+
+
+class GuardedStream:
+    """RestrictedGuard.guard for a streamed answer, fed chunk by chunk."""
+
+    def __init__(self, guard: RestrictedGuard):
+        self._guard = guard
+        # A name split across chunks must be seen whole before its first characters go out
+        self._hold = max(guard.max_name_length - 1, 0)
+        self._parts: List[str] = []
+        self._tail = ""  # received but not yet released
+        self.denial: Optional[str] = None
+
+    @property
+    def text(self) -> str:
+        """Everything received so far."""
+        return "".join(self._parts)
+
+    def feed(self, chunk: str) -> str:
+        """Text that is now safe to send; empty once the answer has been denied."""
+        if self.denial is not None:
+            return ""
+        self._parts.append(chunk)
+        # Any name ending in this chunk starts within the held-back tail
+        window = self._tail + chunk
+        self.denial = self._guard.check(window)
+        if self.denial is not None:
+            return ""
+        if len(window) <= self._hold:
+            self._tail = window
+            return ""
+        self._tail = window[len(window) - self._hold:] if self._hold else ""
+        return window[:len(window) - self._hold]
+
+    def finish(self) -> str:
+        """The held-back tail, at the end of the stream."""
+        if self.denial is not None:
+            return ""
+        released, self._tail = self._tail, ""
+        return released
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, Optional
+
+from answer_cache import sql_ttl
+from invalidation import changed_since, on_tables_changed
+from result_format import ShapedResult
+from sql_validator import normalize_sql
+
+
+### SQL result cache
+# Sits in execute_query, below the answer cache: different questions often generate the same
+# SELECT (doctor lists, department schedules). Keys are normalized SQL; each entry is tagged
+# with the tables the validator found in the query and expires with the most volatile of them
+# (answer_cache.TABLE_TTLS). Booking writes evict entries tagged with the tables they change,
+# and a result read before such a write but stored after it is refused (see invalidation.py).
+
+MAX_BYTES = int(os.getenv("SQL_RESULT_CACHE_MAX_BYTES", str(4 * 1024 * 1024)))
+
+ENTRY_OVERHEAD = 200
+
+
+class ResultCache:
+    def __init__(self, max_bytes: int = MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size_bytes = 0
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._tables: Dict[str, Dict[str, int]] = {}
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def _count(self, tables: FrozenSet[str], outcome: str):
+        for table in tables or ("(none)",):
+            counts = self._tables.setdefault(table, {"hits": 0, "misses": 0, "invalidated": 0})
+            counts[outcome] += 1
+
+    def get(self, query: str, tables: FrozenSet[str]) -> Optional[ShapedResult]:
+        key = normalize_sql(query)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() >= entry[2]:
+                self._remove(key)
+                self.expirations += 1
+                entry = None
+            if entry is None:
+                self.misses += 1
+                self._count(tables, "misses")
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self._count(tables, "hits")
+            return entry[0]
+
+    def put(self, query: str, tables: FrozenSet[str], result: ShapedResult, generation: Optional[int] = None) -> bool:
+        """Store a result; False if it is too big or a table changed since generation (taken before executing)."""
+        key = normalize_sql(query)
+        size = len(key.encode()) + len(result.text.encode()) + ENTRY_OVERHEAD
+        if size > self.max_bytes:
+            return False
+        with self._lock:
+            if generation is not None and changed_since(tables, generation):
+                self.stale_puts += 1
+                return False
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, tables, time.monotonic() + sql_ttl(tables), size)
+            self.size_bytes += size
+            while self.size_bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def invalidate_tables(self, tables: Iterable[str]) -> int:
+        """Drop every result that read one of the given tables."""
+        tables = set(tables)
+        with self._lock:
+            stale = [key for key, entry in self._entries.items() if entry[1] & tables]
+            for key in stale:
+                self._count(self._entries[key][1] & tables, "invalidated")
+                self._remove(key)
+            self.invalidations += len(stale)
+        return len(stale)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_puts": self.stale_puts,
+        }
+
+    def table_stats(self) -> Dict[str, dict]:
+        """Lookups per table the queries read (a query counts once for each of its tables)."""
+        with self._lock:
+            return {
+                table: {**counts, "hit_rate": counts["hits"] / (counts["hits"] + counts["misses"])
+                        if counts["hits"] + counts["misses"] else 0.0}
+                for table, counts in self._tables.items()
+            }
+
+    def _remove(self, key: str):
+        entry = self._entries.pop(key)
+        self.size_bytes -= entry[3]
+
+
+result_cache = ResultCache()
+on_tables_changed(result_cache.invalidate_tables)
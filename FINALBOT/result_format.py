@@ -0,0 +1,60 @@
+import csv
+import io
+import os
+from typing import List, NamedTuple
+
+
+### SQL result shaping
+# The answer prompt only needs a bounded preview of the result. Rows are read from a streaming
+# cursor, the first SQL_RESULT_MAX_ROWS are kept and encoded as compact CSV, and the rest are
+# only counted, so memory and prompt size stay bounded however large the table is.
+
+SQL_RESULT_MAX_ROWS = int(os.getenv("SQL_RESULT_MAX_ROWS", "50"))
+SQL_RESULT_MAX_CELL_CHARS = int(os.getenv("SQL_RESULT_MAX_CELL_CHARS", "100"))
+# Rows fetched per round trip from the server-side cursor
+SQL_FETCH_BATCH = int(os.getenv("SQL_FETCH_BATCH", "500"))
+
+NO_ROWS = "(no rows)"
+
+
+class ShapedResult(NamedTuple):
+    text: str
+    row_count: int  # exact number of rows the query returned
+    shown_rows: int
+
+
+class RowShaper:
+    """Collects at most max_rows rows, counts the rest, and renders them as CSV."""
+
+    def __init__(self, columns: List[str], max_rows: int = SQL_RESULT_MAX_ROWS,
+                 max_cell_chars: int = SQL_RESULT_MAX_CELL_CHARS):
+        self.columns = list(columns)
+        self.max_rows = max_rows
+        self.max_cell_chars = max_cell_chars
+        self.rows: List[list] = []
+        self.row_count = 0
+
+    def add(self, row):
+        self.row_count += 1
+        if len(self.rows) < self.max_rows:
+            self.rows.append([self._cell(value) for value in row])
+
+    def finish(self) -> ShapedResult:
+        if not self.row_count:
+            return ShapedResult(NO_ROWS, 0, 0)
+        buffer = io.StringIO()
+        writer = csv.writer(buffer, lineterminator="\n")
+        writer.writerow(self.columns)
+        writer.writerows(self.rows)
+        omitted = self.row_count - len(self.rows)
+        if omitted:
+            buffer.write(f"... {omitted} more rows omitted ({self.row_count} rows total)\n")
+        return ShapedResult(buffer.getvalue().rstrip("\n"), self.row_count, len(self.rows))
+
+    def _cell(self, value) -> str:
+        if value is None:
+            return "NULL"
+        text = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        if len(text) > self.max_cell_chars:
+            text = text[: self.max_cell_chars - 3] + "..."
+        return text
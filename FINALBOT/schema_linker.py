@@ -0,0 +1,195 @@
+import os
+import threading
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, NamedTuple, Optional
+
+from text_utils import content_terms, estimate_tokens
+
+
+### Question-aware schema pruning
+# write_query only needs the tables a question talks about. A lexical index over table names,
+# domain aliases and column names (built once per schema version) scores every table against
+# the question; the matching tables, the tables they reference and the tables on the join
+# paths between them are rendered instead of the whole schema. Questions that match nothing
+# strongly enough get the full schema, as before.
+
+SCHEMA_LINKING = os.getenv("SCHEMA_LINKING", "1") == "1"
+# A table name or alias hit scores TABLE_WEIGHT; weaker evidence needs several column hits
+SCHEMA_LINK_MIN_SCORE = float(os.getenv("SCHEMA_LINK_MIN_SCORE", "2"))
+# Pruning that keeps more than this share of the tables is not worth the risk
+SCHEMA_LINK_MAX_FRACTION = float(os.getenv("SCHEMA_LINK_MAX_FRACTION", "0.8"))
+SCHEMA_LINK_CACHE_SIZE = int(os.getenv("SCHEMA_LINK_CACHE_SIZE", "256"))
+
+TABLE_WEIGHT = 3.0
+ALIAS_WEIGHT = 2.0
+COLUMN_WEIGHT = 1.0
+
+# How users refer to the clinic tables without naming them
+TABLE_ALIASES = {
+    "appointment": "booking booked schedule slot free available availability visit",
+    "doctor": "physician specialist dr",
+    "department": "specialty specialization",
+    "medical_bill": "bill cost pay paid payment invoice fee charge",
+    "examination_detail": "examination exam diagnosis",
+    "prescribed_drugs": "prescription prescribe medicine medication",
+}
+
+
+class LinkedSchema(NamedTuple):
+    text: str  # table info to put in the prompt
+    full_tokens: int  # what the whole schema would have cost
+    tables: Optional[int]  # tables kept; None when the full schema is used
+
+
+class SchemaLinker:
+    def __init__(self, render: Callable[[Dict[str, dict]], str], restricted_tables=(),
+                 aliases: Dict[str, str] = TABLE_ALIASES, min_score: float = SCHEMA_LINK_MIN_SCORE,
+                 max_fraction: float = SCHEMA_LINK_MAX_FRACTION, cache_size: int = SCHEMA_LINK_CACHE_SIZE):
+        self._render = render
+        self._restricted = frozenset(restricted_tables)
+        self._aliases = aliases
+        self.min_score = min_score
+        self.max_fraction = max_fraction
+        self._cache_size = cache_size
+        self._lock = threading.Lock()
+        self._version = None
+        self._tables: Dict[str, dict] = {}
+        self._index: Dict[str, Dict[str, float]] = {}
+        self._neighbours: Dict[str, set] = {}
+        self._parents: Dict[str, set] = {}
+        self._rendered: "OrderedDict[frozenset, str]" = OrderedDict()
+        self.questions = 0
+        self.linked = 0
+        self.fallbacks = 0
+        self.tables_selected = 0
+        self.full_tokens = 0
+        self.prompt_tokens = 0
+
+    def _build(self, tables: Dict[str, dict], version: int):
+        index: Dict[str, Dict[str, float]] = {}
+
+        def add(text: str, table: str, weight: float):
+            for term in content_terms(text.replace("_", " ")):
+                postings = index.setdefault(term, {})
+                postings[table] = max(postings.get(table, 0.0), weight)
+
+        for table, info in tables.items():
+            add(table, table, TABLE_WEIGHT)
+            add(self._aliases.get(table, ""), table, ALIAS_WEIGHT)
+            # Foreign key columns (patient_id, ...) name the referenced table, which the join paths cover
+            fk_columns = {column for fk in info["foreign_keys"] for column in fk["columns"]}
+            for column in info["columns"]:
+                if column not in fk_columns:
+                    add(column, table, COLUMN_WEIGHT)
+        # Terms found in most tables (id, name, ...) say nothing about which one is meant
+        common = {term for term, postings in index.items() if len(postings) > max(2, len(tables) // 2)}
+        index = {term: postings for term, postings in index.items() if term not in common}
+
+        neighbours = {table: set() for table in tables}
+        parents = {table: set() for table in tables}
+        for table, info in tables.items():
+            for fk in info["foreign_keys"]:
+                referred = fk["referred_table"]
+                if referred in tables and referred != table:
+                    neighbours[table].add(referred)
+                    neighbours[referred].add(table)
+                    parents[table].add(referred)
+
+        self._tables, self._index = tables, index
+        self._neighbours, self._parents = neighbours, parents
+        self._rendered.clear()
+        self._version = version
+
+    def scores(self, question: str) -> Dict[str, float]:
+        """Table relevance for the question (index must be built)."""
+        scores: Dict[str, float] = {}
+        for term in set(content_terms(question)):
+            for table, weight in self._index.get(term, {}).items():
+                scores[table] = scores.get(table, 0.0) + weight
+        return scores
+
+    def _join_path(self, source: str, target: str) -> List[str]:
+        """Shortest foreign-key path between two tables, avoiding restricted ones."""
+        previous = {source: None}
+        queue = deque([source])
+        while queue:
+            table = queue.popleft()
+            if table == target:
+                path = []
+                while table is not None:
+                    path.append(table)
+                    table = previous[table]
+                return path
+            for neighbour in self._neighbours[table]:
+                if neighbour not in previous and (neighbour == target or neighbour not in self._restricted):
+                    previous[neighbour] = table
+                    queue.append(neighbour)
+        return []
+
+    def link(self, question: str, tables: Dict[str, dict], version: int) -> Optional[List[str]]:
+        """Tables to show for the question, in schema order; None when the full schema should be used."""
+        if self._version != version:
+            with self._lock:
+                if self._version != version:
+                    self._build(tables, version)
+        seeds = [table for table, score in self.scores(question).items() if score >= self.min_score]
+        if not seeds:
+            return None
+
+        selected = set(seeds)
+        for table in seeds:
+            selected |= self._parents[table] - self._restricted
+        for i, source in enumerate(seeds):
+            for target in seeds[i + 1:]:
+                selected.update(self._join_path(source, target))
+        if len(selected) > self.max_fraction * len(self._tables):
+            return None
+        return [table for table in self._tables if table in selected]
+
+    def linked_schema(self, question: str, snapshot) -> LinkedSchema:
+        """Pruned table info for the question from a SchemaSnapshot (or its full table info), not
+        yet counted in stats(): a speculative prefetch may compute it for a question that is not
+        SQL at all. record() it once it goes into a prompt."""
+        full = snapshot.get_table_info()
+        linked = self.link(question, snapshot.tables, snapshot.current_version()) if SCHEMA_LINKING else None
+        if linked is None:
+            return LinkedSchema(full, estimate_tokens(full), None)
+
+        key = frozenset(linked)
+        with self._lock:
+            info = self._rendered.get(key)
+            if info is not None:
+                self._rendered.move_to_end(key)
+        if info is None:
+            info = self._render({table: self._tables[table] for table in linked})
+            with self._lock:
+                self._rendered[key] = info
+                while len(self._rendered) > self._cache_size:
+                    self._rendered.popitem(last=False)
+        return LinkedSchema(info, estimate_tokens(full), len(linked))
+
+    def record(self, linked: LinkedSchema):
+        """Count a linked schema that was sent to the LLM."""
+        if not SCHEMA_LINKING:
+            return
+        with self._lock:
+            self.questions += 1
+            self.full_tokens += linked.full_tokens
+            if linked.tables is None:
+                self.fallbacks += 1
+                self.prompt_tokens += linked.full_tokens
+            else:
+                self.linked += 1
+                self.tables_selected += linked.tables
+                self.prompt_tokens += estimate_tokens(linked.text)
+
+    def stats(self) -> dict:
+        return {
+            "questions": self.questions,
+            "linked": self.linked,
+            "fallbacks": self.fallbacks,
+            "avg_tables_linked": self.tables_selected / self.linked if self.linked else 0.0,
+            "schema_tokens_full": self.full_tokens,
+            "schema_tokens_sent": self.prompt_tokens,
+            "schema_tokens_saved": self.full_tokens - self.prompt_tokens,
+        }
@@ -0,0 +1,125 @@
+import hashlib
+import os
+import threading
+import time
+from typing import Callable, Dict, Optional
+
+import sqlalchemy
+
+
+### Schema snapshot
+# Reflecting the schema costs one metadata round trip per table, so we do it once and
+# keep the rendered table info in memory. A cheap fingerprint query tells us when the
+# schema actually changed; only then do we reflect again.
+
+SCHEMA_CHECK_INTERVAL = float(os.getenv("SCHEMA_CHECK_INTERVAL", "30"))
+# Optional table maintained by migrations, e.g. `CREATE TABLE schema_version (version INT)`
+SCHEMA_VERSION_TABLE = os.getenv("SCHEMA_VERSION_TABLE")
+
+MYSQL_FINGERPRINT_SQL = """
+    SELECT COUNT(*), COALESCE(SUM(CRC32(CONCAT_WS('|', TABLE_NAME, COLUMN_NAME, COLUMN_TYPE, ORDINAL_POSITION))), 0)
+    FROM information_schema.COLUMNS
+    WHERE TABLE_SCHEMA = DATABASE()
+"""
+
+
+class SchemaSnapshot:
+    """Reflected schema plus its rendered table info, refreshed only on fingerprint change."""
+
+    def __init__(self, engine, render: Callable[[Dict[str, dict]], str],
+                 check_interval: float = SCHEMA_CHECK_INTERVAL,
+                 version_table: Optional[str] = SCHEMA_VERSION_TABLE):
+        self._engine = engine
+        self._render = render
+        self._check_interval = check_interval
+        self._version_table = version_table
+        self._lock = threading.Lock()
+        self._tables: Dict[str, dict] = {}
+        self._table_info: Optional[str] = None
+        self._fingerprint = None
+        self._checked_at = 0.0
+        self.version = 0
+        self.reflections = 0
+        self.fingerprint_checks = 0
+
+    @property
+    def tables(self) -> Dict[str, dict]:
+        """Reflected tables: {name: {"columns": [...], "foreign_keys": [...]}}."""
+        self._ensure_fresh()
+        return self._tables
+
+    def get_table_info(self) -> str:
+        self._ensure_fresh()
+        return self._table_info
+
+    def current_version(self) -> int:
+        """Version number, bumped each time the schema is reflected again."""
+        self._ensure_fresh()
+        return self.version
+
+    def invalidate(self):
+        """Force a reflection on the next access."""
+        with self._lock:
+            self._table_info = None
+
+    def stats(self) -> dict:
+        return {
+            "version": self.version,
+            "tables": len(self._tables),
+            "reflections": self.reflections,
+            "fingerprint_checks": self.fingerprint_checks,
+        }
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._table_info is not None and now - self._checked_at < self._check_interval:
+            return
+        with self._lock:
+            # Another thread may have refreshed while we waited for the lock
+            if self._table_info is not None and now - self._checked_at < self._check_interval:
+                return
+            fingerprint = self._read_fingerprint()
+            self._checked_at = time.monotonic()
+            if self._table_info is not None and fingerprint is not None and fingerprint == self._fingerprint:
+                return
+            self._tables = self._reflect()
+            self._table_info = self._render(self._tables)
+            self._fingerprint = fingerprint
+            self.version += 1
+            self.reflections += 1
+
+    def _read_fingerprint(self):
+        """Single cheap query that changes whenever a table or column changes."""
+        self.fingerprint_checks += 1
+        dialect = self._engine.dialect.name
+        try:
+            with self._engine.connect() as conn:
+                if self._version_table:
+                    row = conn.execute(sqlalchemy.text(f"SELECT MAX(version) FROM {self._version_table}")).fetchone()
+                elif dialect == "mysql":
+                    row = conn.execute(sqlalchemy.text(MYSQL_FINGERPRINT_SQL)).fetchone()
+                elif dialect == "sqlite":
+                    row = conn.execute(sqlalchemy.text("PRAGMA schema_version")).fetchone()
+                else:
+                    return None
+        except sqlalchemy.exc.SQLAlchemyError as e:
+            print(f"Schema fingerprint failed, reflecting instead: {e}")
+            return None
+        return hashlib.sha1(repr(tuple(row)).encode()).hexdigest()
+
+    def _reflect(self) -> Dict[str, dict]:
+        inspector = sqlalchemy.inspect(self._engine)
+        tables = {}
+        for table in inspector.get_table_names():
+            tables[table] = {
+                "columns": [column["name"] for column in inspector.get_columns(table)],
+                "foreign_keys": [
+                    {
+                        "columns": fk["constrained_columns"],
+                        "referred_table": fk["referred_table"],
+                        "referred_columns": fk["referred_columns"],
+                    }
+                    for fk in inspector.get_foreign_keys(table)
+                ],
+            }
+        return tables
@@ -1,21 +1,164 @@
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-from unified_bot import get_answer as get_final_answer
+import asyncio
+import os
+import time
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field
+import json
+from typing import List, Optional
+from unified_bot import aget_answer as get_final_answer, abatch_answer, astream_answer
+from pipelines import pipelines
+from http_client import backend_client
+from lazy import readiness, warm_up
+from tracing import REQUEST_ID_HEADER, new_request_id, request_context, span, stage_stats
+from metrics import prometheus_text
+import limits
+from answer_cache import answer_cache
+from result_cache import result_cache
+from db_config import pool_stats
+from intent_router import intent_router
+from llm_registry import llm_registry
+from sql_templates import sql_templates
+from speculation import speculation_stats
+from availability import availability
+from sessions import sessions
+import sql_bot
 
+# Build DB connections, LLM clients and prompts before accepting traffic instead of on first use
+WARMUP_ON_STARTUP = os.getenv("WARMUP_ON_STARTUP", "0") == "1"
+BATCH_MAX_QUESTIONS = int(os.getenv("BATCH_MAX_QUESTIONS", "100"))
 
-app = FastAPI()
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Compile every bot pipeline once, so compilation is a startup cost and not per request
+    compile_seconds = pipelines.compile_all()
+    app.state.startup_metrics = {"pipeline_compile_seconds": compile_seconds}
+    if WARMUP_ON_STARTUP:
+        start = time.perf_counter()
+        await asyncio.to_thread(warm_up)
+        app.state.startup_metrics["warmup_seconds"] = time.perf_counter() - start
+    yield
+    # Release the pooled keep-alive connections to the appointment backend
+    await backend_client.aclose()
+    backend_client.close()
+
+
+app = FastAPI(lifespan=lifespan)
+
+# Probes and scrapes are not traffic, keep them out of the request histogram
+UNTRACED_PATHS = {"/metrics", "/ready"}
+
+
+@app.middleware("http")
+async def trace_requests(request: Request, call_next):
+    request_id = new_request_id(request.headers.get(REQUEST_ID_HEADER))
+    with request_context(request_id) as trace:
+        if request.url.path in UNTRACED_PATHS:
+            response = await call_next(request)
+        else:
+            with span("request"):
+                response = await call_next(request)
+    response.headers[REQUEST_ID_HEADER] = request_id
+    if trace.spans:
+        response.headers["Server-Timing"] = trace.server_timing()
+    return response
 
 
 class Question(BaseModel):
     question: str
+    # Optional: turns sharing a session_id can refer back to IDs from earlier turns
+    session_id: Optional[str] = Field(None, max_length=64)
 
 @app.post("/chat")
-def chat(question: Question):
+async def chat(question: Question):
     if not question.question:
         raise HTTPException(status_code=400, detail="No question provided")
-    answer = get_final_answer(question.question)
+    answer = await get_final_answer(question.question, question.session_id)
     return {"answer": answer}
 
+class BatchQuestions(BaseModel):
+    questions: List[str]
+
+@app.post("/chat/batch")
+async def chat_batch(batch: BatchQuestions):
+    """Answer a list of questions concurrently; results are in input order with per-item errors and timings."""
+    if not batch.questions:
+        raise HTTPException(status_code=400, detail="No questions provided")
+    if len(batch.questions) > BATCH_MAX_QUESTIONS:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_QUESTIONS} questions per batch")
+    start = time.perf_counter()
+    results = await abatch_answer(batch.questions)
+    return {
+        "results": results,
+        "unique_questions": sum(result["duplicate_of"] is None for result in results),
+        "elapsed_ms": (time.perf_counter() - start) * 1000,
+    }
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+@app.post("/chat/stream")
+async def chat_stream(question: Question):
+    """Server-sent events: stage events (routed, query, rows), answer tokens, then done."""
+    if not question.question:
+        raise HTTPException(status_code=400, detail="No question provided")
+
+    async def events():
+        start = time.perf_counter()
+        first_output = None
+        async for event, data in astream_answer(question.question, question.session_id):
+            if first_output is None and event in ("token", "answer", "denied", "error"):
+                first_output = time.perf_counter() - start
+            yield _sse(event, data)
+        yield _sse("done", {
+            "elapsed_ms": (time.perf_counter() - start) * 1000,
+            "first_output_ms": first_output * 1000 if first_output is not None else None,
+        })
+
+    return StreamingResponse(events(), media_type="text/event-stream",
+                             headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@app.get("/ready")
+async def ready():
+    """Which lazily built components are warm; 503 if a warmup was requested and something failed."""
+    components = readiness()
+    failed = [name for name, component in components.items() if component["error"]]
+    body = {
+        "ready": not (WARMUP_ON_STARTUP and failed),
+        "warmup_on_startup": WARMUP_ON_STARTUP,
+        "components": components,
+        "startup": app.state.startup_metrics,
+    }
+    return JSONResponse(body, status_code=200 if body["ready"] else 503)
+
+def _metric_sections():
+    return [
+        ("clinicbot_stage", stage_stats(), "stage"),
+        ("clinicbot_llm", llm_registry.stats()["models"], "model"),
+        ("clinicbot_backend", backend_client.stats(), "endpoint"),
+        ("clinicbot_db_pool", pool_stats(), "pool"),
+        ("clinicbot_concurrency", {limit.name: limit.stats() for limit in (limits.llm, limits.db, limits.backend, limits.batch)}, "limit"),
+        ("clinicbot_answer_cache", answer_cache.stats(), None),
+        ("clinicbot_sql_result_cache", result_cache.stats(), None),
+        ("clinicbot_sql_result_cache_table", result_cache.table_stats(), "table"),
+        ("clinicbot_intent_router", intent_router.stats(), None),
+        ("clinicbot_sql_validator", sql_bot.sql_validator.stats(), None),
+        ("clinicbot_sql_templates", sql_templates.stats(), None),
+        ("clinicbot_pipeline_compile_seconds", pipelines.compile_seconds, "pipeline"),
+        ("clinicbot_schema", sql_bot.schema_stats(), None),
+        ("clinicbot_schema_linker", sql_bot.schema_linker.stats(), None),
+        ("clinicbot_speculation", speculation_stats.stats(), None),
+        ("clinicbot_availability", availability.stats(), None),
+        ("clinicbot_sessions", sessions.stats(), None),
+    ]
+
+@app.get("/metrics")
+async def metrics():
+    """Stage latency histograms and every subsystem's stats, in the Prometheus text format."""
+    return PlainTextResponse(prometheus_text(_metric_sections()), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=5000)
\ No newline at end of file
+    uvicorn.run(app, host="0.0.0.0", port=5000)
@@ -0,0 +1,198 @@
+import os
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from text_utils import estimate_tokens
+
+
+### Conversation sessions
+# /chat is stateless unless the client sends a session_id. A session keeps only what later
+# turns need: the patient, doctor and appointment IDs seen so far, the last route and a short
+# rolling summary of recent questions. Routing always sees the question as asked; once a bot is
+# chosen, the IDs it needs that the question leaves out (and, for follow-ups, the previous
+# question) are appended to what that bot gets as a compact context note, capped at
+# SESSION_CONTEXT_TOKENS. IDs only go to the SQL and booking bots, and booking requests are
+# never repeated into a note, so a follow-up cannot turn into a second booking. Each session is
+# capped in bytes, idle sessions expire, and the store evicts least recently used sessions past
+# its byte cap, so memory stays bounded.
+
+SESSION_MAX_BYTES = int(os.getenv("SESSION_MAX_BYTES", "2048"))
+SESSION_STORE_MAX_BYTES = int(os.getenv("SESSION_STORE_MAX_BYTES", str(16 * 1024 * 1024)))
+SESSION_TTL = float(os.getenv("SESSION_TTL", "1800"))
+SESSION_CONTEXT_TOKENS = int(os.getenv("SESSION_CONTEXT_TOKENS", "48"))
+# Characters of a question kept in the rolling summary
+SUMMARY_QUESTION_CHARS = 100
+
+# Rough per-session bookkeeping overhead (object, dicts, timestamps), added to the text sizes
+SESSION_OVERHEAD = 300
+
+ID_KINDS = ("patient", "doctor", "appointment")
+# Routes whose bots take IDs; the FAQ bot has no use for them and shares its cache across users
+ID_ROUTES = ("sql", "function_call")
+_QUESTION_ID = re.compile(r"\b(patient|doctor|appointment)\s*(?:id)?\s*(?:is)?\s*[:#=]?\s*(\d+)", re.I)
+# Booking answers list the request and response fields as "- **doctorId**: 3"
+_ANSWER_ID = re.compile(r"\*\*(patient|doctor|appointment)Id\*\*:\s*(\d+)")
+# How a question refers to an ID it does not state: "the same doctor", "that appointment". The
+# patient needs an explicit reference ("my patient ID", "same patient", "me again"); a plain
+# "me" or "my" is in most questions ("Show me doctors", "for my mother") and names no one.
+_REFERENCES = {
+    "patient": re.compile(r"\bmy\s+(patient\s+)?id\b|\b(the\s+)?(same|that|this)\s+patient\b|\b(me|i)\s+again\b", re.I),
+    "doctor": re.compile(r"\b(the|that|this|same|my)\s+doctor\b|\b(him|her)\b", re.I),
+    "appointment": re.compile(r"\b(the|that|this|same|my)\s+appointment\b", re.I),
+}
+# A follow-up leans on the previous question: it opens with a connective ("and on Friday?",
+# "what about doctor 3?"), has a pronoun for its subject ("is it free on Monday?") or ends on
+# one ("can you cancel it?"). "this doctor" or "that day" inside an ordinary question has a
+# subject of its own and is not one.
+_FOLLOW_UP = re.compile(
+    r"^\W*(and|also|then|but|or|what about|how about|what if|same for|instead)\b"
+    r"|^\W*(is|are|was|were|does|do|did|can|will)\s+(it|they)\b"
+    r"|\b(it|them|those|that|that one|the same)\W*$",
+    re.I,
+)
+
+
+class Session:
+    __slots__ = ("ids", "last_route", "summary", "updated_at", "size")
+
+    def __init__(self):
+        self.ids: Dict[str, int] = {}
+        self.last_route: Optional[str] = None
+        self.summary: List[Tuple[str, Optional[str]]] = []  # (question, route)
+        self.updated_at = time.monotonic()
+        # Counted into the store's size_bytes on the first record()
+        self.size = 0
+
+    def _measure(self) -> int:
+        return SESSION_OVERHEAD + sum(len(line.encode()) + 16 for line, _ in self.summary) + 24 * len(self.ids)
+
+
+class SessionStore:
+    def __init__(self, max_bytes: int = SESSION_STORE_MAX_BYTES, session_max_bytes: int = SESSION_MAX_BYTES,
+                 ttl: float = SESSION_TTL, context_tokens: int = SESSION_CONTEXT_TOKENS):
+        self.max_bytes = max_bytes
+        self.session_max_bytes = session_max_bytes
+        self.ttl = ttl
+        self.context_tokens = context_tokens
+        self.size_bytes = 0
+        self._sessions: "OrderedDict[str, Session]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.evictions = 0
+        self.expirations = 0
+        self.contextualized = 0
+        self.context_tokens_added = 0
+
+    def _get(self, session_id: str) -> Optional[Session]:
+        session = self._sessions.get(session_id)
+        if session is not None and time.monotonic() - session.updated_at >= self.ttl:
+            self._remove(session_id)
+            self.expirations += 1
+            return None
+        return session
+
+    def _parts(self, session_id: Optional[str], question: str, route: str, previous: bool) -> List[str]:
+        if not session_id:
+            return []
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return []
+            parts = []
+            if route in ID_ROUTES:
+                stated = {kind.lower() for kind, _ in _QUESTION_ID.findall(question)}
+                parts = [
+                    f"{kind} ID {session.ids[kind]}" for kind in ID_KINDS
+                    if kind in session.ids and kind not in stated and _REFERENCES[kind].search(question)
+                ]
+            if previous and session.summary and _FOLLOW_UP.search(question):
+                line, last_route = session.summary[-1]
+                if last_route != "function_call":
+                    parts.append(f"previous question: {line}")
+            return parts
+
+    def note(self, session_id: Optional[str], question: str, route: str, previous: bool = True) -> str:
+        """Compact context for the bot chosen for the question, to append to it; "" when there is none.
+
+        previous: whether a follow-up may carry the previous question (never a booking request).
+        """
+        parts = self._parts(session_id, question, route, previous)
+        # Fit the note into the per-turn budget, dropping the least essential parts last-first
+        while parts:
+            note = f" (Context: {'; '.join(parts)})"
+            tokens = estimate_tokens(note)
+            if tokens <= self.context_tokens:
+                with self._lock:
+                    self.contextualized += 1
+                    self.context_tokens_added += tokens
+                return note
+            parts.pop()
+        return ""
+
+    def adds_context(self, session_id: Optional[str], question: str, route: str = "sql") -> bool:
+        """Whether the route's bot would get a note for the question; the default asks whether
+        any would (the SQL bot's note is the fullest)."""
+        return bool(self._parts(session_id, question, route, True))
+
+    def record(self, session_id: Optional[str], question: str, route: Optional[str], answer: str = ""):
+        """Remember the turn: IDs from the question and answer, the route, a summary line."""
+        if not session_id:
+            return
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                session = Session()
+                self._sessions[session_id] = session
+            else:
+                self._sessions.move_to_end(session_id)
+            for kind, value in _QUESTION_ID.findall(question) + _ANSWER_ID.findall(answer or ""):
+                session.ids[kind.lower()] = int(value)
+            if route:
+                session.last_route = route
+            session.summary.append((question.strip()[:SUMMARY_QUESTION_CHARS], route))
+            session.updated_at = time.monotonic()
+
+            old_size = session.size
+            session.size = session._measure()
+            while session.size > self.session_max_bytes and len(session.summary) > 1:
+                session.summary.pop(0)
+                session.size = session._measure()
+            self.size_bytes += session.size - old_size
+            while self.size_bytes > self.max_bytes and len(self._sessions) > 1:
+                self._remove(next(iter(self._sessions)))
+                self.evictions += 1
+
+    def get(self, session_id: str) -> Optional[dict]:
+        """What the session holds, for debugging and tests."""
+        with self._lock:
+            session = self._get(session_id)
+            if session is None:
+                return None
+            return {"ids": dict(session.ids), "last_route": session.last_route,
+                    "summary": [f"{line} [{route}]" if route else line for line, route in session.summary],
+                    "size_bytes": session.size}
+
+    def clear(self):
+        with self._lock:
+            self._sessions.clear()
+            self.size_bytes = 0
+
+    def stats(self) -> dict:
+        return {
+            "sessions": len(self._sessions),
+            "size_bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "contextualized": self.contextualized,
+            "context_tokens_added": self.context_tokens_added,
+        }
+
+    def _remove(self, session_id: str):
+        session = self._sessions.pop(session_id)
+        self.size_bytes -= session.size
+
+
+sessions = SessionStore()
@@ -0,0 +1,123 @@
+import asyncio
+import functools
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+
+### Speculative prefetch
+# While the router LLM decides, each route's cheap preparation (FAQ retrieval and RAG prompt
+# assembly, schema snapshot check and table info) runs concurrently in worker threads. The
+# winning route picks up its result instead of doing the work after routing. Cancelling a
+# to_thread task does not interrupt its thread, so losing routes are not cancelled: they run
+# to completion in the background and the time their thread actually took is recorded as
+# waste, so the trade can be measured. A loser that has not started yet (still waiting for its
+# concurrency limit when routing ends) is skipped.
+
+SPECULATIVE_PREFETCH = os.getenv("SPECULATIVE_PREFETCH", "1") == "1"
+
+
+class SpeculationStats:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started = 0
+        self.used: Dict[str, int] = {}
+        self.wasted: Dict[str, int] = {}
+        self.failed = 0
+        self.used_seconds = 0.0  # prefetch work taken off the critical path
+        self.wasted_seconds = 0.0  # work spent on routes that lost
+        self.wait_seconds = 0.0  # time the winner was still running after routing finished
+
+    def record(self, route: str, used: bool, seconds: float, wait: float = 0.0):
+        with self._lock:
+            counts = self.used if used else self.wasted
+            counts[route] = counts.get(route, 0) + 1
+            if used:
+                self.used_seconds += seconds
+                self.wait_seconds += wait
+            else:
+                self.wasted_seconds += seconds
+
+    def stats(self) -> dict:
+        return {
+            "started": self.started,
+            "used": dict(self.used),
+            "wasted": dict(self.wasted),
+            "failed": self.failed,
+            "used_seconds": self.used_seconds,
+            "wasted_seconds": self.wasted_seconds,
+            "wait_seconds": self.wait_seconds,
+        }
+
+
+speculation_stats = SpeculationStats()
+
+
+class Speculation:
+    """Per-route prefetch work for one question, started before the routing decision is known.
+
+    work: route -> sync function, run in a worker thread.
+    limits: route -> ConcurrencyLimit the route's work runs under (e.g. limits.db for DB reads).
+    """
+
+    def __init__(self, work: Dict[str, Callable[[], Any]], limits: Optional[Dict[str, Any]] = None):
+        self.work = work
+        self.limits = limits or {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._seconds: Dict[str, float] = {}
+        self._decided = False
+        self._winner: Optional[str] = None
+
+    def start(self):
+        if self._tasks or not SPECULATIVE_PREFETCH:
+            return
+        speculation_stats.started += 1
+        self._tasks = {route: asyncio.ensure_future(self._run(route, func)) for route, func in self.work.items()}
+
+    async def _run(self, route: str, func):
+        limit = self.limits.get(route)
+        if limit is None:
+            return await self._start_thread(route, func)
+        async with limit:
+            return await self._start_thread(route, func)
+
+    async def _start_thread(self, route: str, func):
+        if self._decided and route != self._winner:
+            return None
+        return await asyncio.to_thread(self._timed, route, func)
+
+    def _timed(self, route: str, func):
+        # Runs in the worker thread: the cost of the work itself, however the waiting task ends
+        start = time.perf_counter()
+        try:
+            return func()
+        finally:
+            self._seconds[route] = time.perf_counter() - start
+
+    def _record_wasted(self, route: str, task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            speculation_stats.failed += 1
+        speculation_stats.record(route, False, self._seconds.get(route, 0.0))
+
+    async def take(self, route: Optional[str]) -> Optional[Any]:
+        """The winning route's prefetched result (None if not started or it failed).
+
+        The other routes are left to finish in the background; their thread time is recorded
+        as waste once they do.
+        """
+        self._decided, self._winner = True, route
+        for other, task in self._tasks.items():
+            if other != route:
+                task.add_done_callback(functools.partial(self._record_wasted, other))
+        task = self._tasks.get(route)
+        result = None
+        if task is not None:
+            wait_start = time.perf_counter()
+            try:
+                result = await task
+            except Exception:
+                speculation_stats.failed += 1
+            speculation_stats.record(route, True, self._seconds.get(route, 0.0), time.perf_counter() - wait_start)
+        self._tasks = {}
+        return result
@@ -0,0 +1,170 @@
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import List, NamedTuple, Optional, Tuple
+
+from sqlparse import tokens as T
+from sqlparse.lexer import Lexer
+
+from text_utils import normalize_question
+
+
+### Text-to-SQL template cache
+# Questions that differ only in literals ("patient ID 10" vs "patient ID 42") get the same SQL
+# shape. After a generated query passes validation we swap the question's literals in the SQL
+# for slots and store it under the question's shape; the next question with that shape gets
+# its SQL by slot-filling instead of an LLM call. Only unambiguous mappings are stored.
+
+SQL_TEMPLATE_CACHE_SIZE = int(os.getenv("SQL_TEMPLATE_CACHE_SIZE", "512"))
+
+_QUESTION_LITERAL = re.compile(r"(?P<date>\b\d{4}-\d{2}-\d{2}\b)|'(?P<squote>[^']*)'|\"(?P<dquote>[^\"]*)\"|(?P<num>\b\d+\b)")
+_DATE_LIKE = re.compile(r"\d{4}-\d{2}-\d{2}")
+
+
+class Literal(NamedTuple):
+    kind: str  # "num", "date" or "str"
+    value: str
+
+
+def extract_literals(question: str) -> Tuple[str, List[Literal]]:
+    """Question shape (literals replaced by __kind__ placeholders) and its literals in order."""
+    literals = []
+
+    def placeholder(match):
+        kind = match.lastgroup
+        value = match.group(kind)
+        kind = "str" if kind in ("squote", "dquote") else kind
+        literals.append(Literal(kind, value))
+        return f" __{kind}__ "
+
+    shape = _QUESTION_LITERAL.sub(placeholder, question)
+    return normalize_question(shape), literals
+
+
+def _sql_literal(ttype, value) -> Optional[str]:
+    """Plain value of a SQL number or single-quoted string token."""
+    if ttype in T.Number.Integer:
+        return value
+    if ttype in T.String.Single and len(value) >= 2:
+        return value[1:-1].replace("''", "'")
+    return None
+
+
+def _safe_literal(literal: Literal) -> bool:
+    # MySQL reads a backslash in a string as an escape, so "a\' OR 1=1 -- " would close the
+    # quote despite the doubled '. Such values are not slot-filled; the LLM path handles them.
+    return literal.kind != "str" or not any(char == "\\" or char < " " for char in literal.value)
+
+
+def _render(literal: Literal, quoted: bool) -> str:
+    if not quoted:
+        return str(int(literal.value))
+    return "'" + literal.value.replace("'", "''") + "'"
+
+
+class SQLTemplate(NamedTuple):
+    parts: Tuple  # SQL text pieces (str) and (slot index, quoted) pairs for the question's literals
+    kinds: Tuple[str, ...]
+
+
+class SQLTemplateCache:
+    def __init__(self, max_entries: int = SQL_TEMPLATE_CACHE_SIZE):
+        self.max_entries = max_entries
+        self.schema_version = None
+        self._templates: "OrderedDict[str, SQLTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._lexer = Lexer.get_default_instance()
+        self.hits = 0
+        self.misses = 0
+        self.stored = 0
+        self.rejected = 0
+        self.revocations = 0
+
+    def lookup(self, question: str, schema_version=None) -> Optional[str]:
+        """Slot-filled SQL for a question whose shape we have seen, else None."""
+        self._check_schema(schema_version)
+        shape, literals = extract_literals(question)
+        with self._lock:
+            template = self._templates.get(shape)
+            if (template is None or template.kinds != tuple(literal.kind for literal in literals)
+                    or not all(map(_safe_literal, literals))):
+                self.misses += 1
+                return None
+            self._templates.move_to_end(shape)
+            self.hits += 1
+        return "".join(
+            part if isinstance(part, str) else _render(literals[part[0]], part[1]) for part in template.parts
+        )
+
+    def store(self, question: str, query: str, schema_version=None) -> bool:
+        """Parameterize a validated query by the question's literals; False if it is not safe to reuse."""
+        self._check_schema(schema_version)
+        shape, literals = extract_literals(question)
+        template = self._parameterize(query, literals)
+        if template is None:
+            self.rejected += 1
+            return False
+        with self._lock:
+            self._templates[shape] = template
+            self._templates.move_to_end(shape)
+            while len(self._templates) > self.max_entries:
+                self._templates.popitem(last=False)
+            self.stored += 1
+        return True
+
+    def revoke(self):
+        """Drop every template, e.g. after a schema change."""
+        with self._lock:
+            self._templates.clear()
+            self.revocations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "templates": len(self._templates),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "stored": self.stored,
+            "rejected": self.rejected,
+            "revocations": self.revocations,
+        }
+
+    def _check_schema(self, schema_version):
+        if schema_version is not None and schema_version != self.schema_version:
+            if self.schema_version is not None:
+                self.revoke()
+            self.schema_version = schema_version
+
+    def _parameterize(self, query: str, literals: List[Literal]) -> Optional[SQLTemplate]:
+        values = [literal.value if literal.kind != "num" else str(int(literal.value)) for literal in literals]
+        if len(set(values)) != len(values):
+            # "doctor 1 for patient 1": we could not tell the slots apart
+            return None
+        parts = []
+        used = set()
+        for ttype, value in self._lexer.get_tokens(query):
+            plain = _sql_literal(ttype, value)
+            slot = values.index(plain) if plain is not None and plain in values else None
+            if slot is not None and (literals[slot].kind == "num" or ttype in T.String):
+                if slot in used:
+                    # The same value appears twice in the SQL (e.g. also as LIMIT), ambiguous
+                    return None
+                used.add(slot)
+                parts.append((slot, ttype in T.String))
+                continue
+            if plain is not None and ttype in T.String and _DATE_LIKE.search(plain):
+                # A date the question did not spell out ("today", "this Monday") goes stale
+                return None
+            if parts and isinstance(parts[-1], str):
+                parts[-1] += value
+            else:
+                parts.append(value)
+        if len(used) != len(literals):
+            # A literal of the question does not appear in the SQL, so its value would be ignored
+            return None
+        return SQLTemplate(tuple(parts), tuple(literal.kind for literal in literals))
+
+
+sql_templates = SQLTemplateCache()
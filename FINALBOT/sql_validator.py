@@ -0,0 +1,142 @@
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, FrozenSet, Iterable, List, NamedTuple
+
+from sqlparse import tokens as T
+from sqlparse.lexer import Lexer
+
+
+### SQL validator
+# Restricted tables and columns are compiled into hash sets once. A query is checked in a
+# single pass over its lexer tokens (no sqlparse grouping), which also collects the tables it
+# reads, and verdicts are cached by normalized SQL since the same generated queries recur.
+
+class QueryVerdict(NamedTuple):
+    valid: bool
+    tables: FrozenSet[str]  # tables named after FROM/JOIN, lowercased
+    reason: str = ""
+
+
+_WHITESPACE = re.compile(r"\s+")
+# Keywords that can appear inside a FROM clause before the next comma-separated table
+_FROM_CLAUSE_KEYWORDS = frozenset({"AS", "ON", "AND", "OR"})
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and drop trailing semicolons; literals keep their case."""
+    return _WHITESPACE.sub(" ", query).strip().rstrip(";").strip()
+
+
+class SQLValidator:
+    def __init__(self, restricted_tables: Iterable[str], restricted_columns: Dict[str, List[str]],
+                 allowed_types: Iterable[str] = ("SELECT",), cache_size: int = 2048):
+        self.restricted_tables = frozenset(name.lower() for name in restricted_tables)
+        self.restricted_columns = frozenset(
+            column.lower() for columns in restricted_columns.values() for column in columns
+        )
+        self.allowed_types = frozenset(allowed_types)
+        self._lexer = Lexer.get_default_instance()
+        self.cache_size = cache_size
+        self._cache: "OrderedDict[str, QueryVerdict]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def is_valid(self, query: str) -> bool:
+        return self.check(query).valid
+
+    def check(self, query: str) -> QueryVerdict:
+        key = normalize_sql(query)
+        with self._lock:
+            verdict = self._cache.get(key)
+            if verdict is not None:
+                self._cache.move_to_end(key)
+                self.hits += 1
+                return verdict
+            self.misses += 1
+        verdict = self._analyze(key)
+        with self._lock:
+            self._cache[key] = verdict
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return verdict
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "cached": len(self._cache),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _analyze(self, query: str) -> QueryVerdict:
+        # The lexer alone is enough: no token grouping, one pass over (ttype, value) pairs
+        tables = set()
+        statement_type = None
+        statement_started = False
+        seen_statement = False
+        depth = 0
+        expect_table = False
+        in_from = False
+        last_table = None
+        for ttype, value in self._lexer.get_tokens(query):
+            if ttype in T.Whitespace or ttype in T.Newline or ttype in T.Comment:
+                continue
+            if not (ttype in T.Punctuation and value == ";"):
+                statement_started = True
+            if ttype in T.Keyword.DML or ttype in T.Keyword.DDL:
+                keyword = value.upper()
+                # Only consider SELECT statements or other allowed statements
+                if keyword not in self.allowed_types:
+                    return QueryVerdict(False, frozenset(tables), f"{keyword} statement")
+                if depth == 0:
+                    statement_type = keyword
+                expect_table = in_from = False
+                last_table = None
+            elif ttype in T.Name or ttype in T.String.Symbol or ttype in T.Keyword:
+                name = value.strip('`"[]').lower()
+                if name in self.restricted_tables:
+                    return QueryVerdict(False, frozenset(tables), f"restricted table {name}")
+                if name in self.restricted_columns:
+                    return QueryVerdict(False, frozenset(tables), f"restricted column {name}")
+                if ttype in T.Keyword:
+                    keyword = " ".join(value.upper().split())
+                    expect_table = keyword == "FROM" or keyword.endswith("JOIN")
+                    in_from = expect_table or (in_from and keyword in _FROM_CLAUSE_KEYWORDS)
+                    last_table = None
+                elif expect_table:
+                    tables.add(name)
+                    last_table = name
+                    expect_table = False
+                else:
+                    last_table = None
+            elif ttype in T.Punctuation:
+                if value == "." and last_table is not None:
+                    # schema.table: the qualifier was not the table
+                    tables.discard(last_table)
+                    expect_table = True
+                elif value == "," and in_from:
+                    expect_table = True
+                elif value == "(":
+                    depth += 1
+                    expect_table = in_from = False
+                elif value == ")":
+                    depth = max(depth - 1, 0)
+                    in_from = False
+                elif value == ";":
+                    if statement_started and statement_type is None:
+                        return QueryVerdict(False, frozenset(tables), "statement without SELECT")
+                    seen_statement = seen_statement or statement_started
+                    statement_type = None
+                    statement_started = False
+                    depth = 0
+                    expect_table = in_from = False
+                last_table = None
+            else:
+                last_table = None
+        if statement_started and statement_type is None:
+            return QueryVerdict(False, frozenset(tables), "statement without SELECT")
+        if not (statement_started or seen_statement):
+            return QueryVerdict(False, frozenset(), "empty query")
+        return QueryVerdict(True, frozenset(tables))
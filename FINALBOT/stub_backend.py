@@ -0,0 +1,83 @@
+# stub_backend.py
+# Local stand-in for the appointment service, for exercising EndpointHandler/BackendClient
+# without the real backend. Run with: python stub_backend.py --port 8080 --latency 0.05
+
+import argparse
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Tuple
+
+
+class StubBackend(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, address, latency: float = 0.0):
+        super().__init__(address, StubHandler)
+        self.latency = latency
+        self.booked = {}  # (doctorId, appointmentDate, timeSlot) -> appointmentId
+        self.ids = itertools.count(1)
+        self.lock = threading.Lock()
+        self.requests = 0
+
+    @property
+    def base_url(self) -> str:
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/api"
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive, like the real service
+
+    def do_POST(self):
+        server: StubBackend = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if server.latency:
+            time.sleep(server.latency)
+        with server.lock:
+            server.requests += 1
+            if self.path == "/api/appointment/doctor":
+                key = (body.get("doctorId"), body.get("appointmentDate"), body.get("timeSlot"))
+                if key in server.booked:
+                    return self._reply(400, {"message": "This time slot is already booked"})
+                appointment_id = next(server.ids)
+                server.booked[key] = appointment_id
+                return self._reply(200, {"message": "Appointment booked successfully", "appointmentId": appointment_id, **body})
+            if self.path == "/api/appointment/cancel":
+                for key, appointment_id in list(server.booked.items()):
+                    if appointment_id == body.get("appointmentId"):
+                        del server.booked[key]
+                        return self._reply(200, {"message": "Appointment cancelled", **body})
+                return self._reply(404, {"message": "Appointment not found"})
+        self._reply(404, {"message": f"Unknown endpoint {self.path}"})
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_stub_backend(port: int = 0, latency: float = 0.0) -> Tuple[StubBackend, threading.Thread]:
+    """Start the stub on a background thread; port 0 picks a free port (see server.base_url)."""
+    server = StubBackend(("127.0.0.1", port), latency=latency)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    return server, thread
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub appointment backend")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds added to every response")
+    args = parser.parse_args()
+    server = StubBackend(("0.0.0.0", args.port), latency=args.latency)
+    print(f"Stub backend on {server.base_url}")
+    server.serve_forever()
@@ -0,0 +1,41 @@
+import re
+
+
+### Shared text helpers
+
+_PUNCTUATION = re.compile(r"[^\w\s@.:/-]|(?<!\d)[.:/-]|[.:/-](?!\d)")
+_WHITESPACE = re.compile(r"\s+")
+
+def normalize_question(question: str) -> str:
+    """Lowercase, drop punctuation (keeping it inside numbers, dates and times) and collapse spaces."""
+    question = _PUNCTUATION.sub(" ", question.lower())
+    return _WHITESPACE.sub(" ", question).strip()
+
+_WORD = re.compile(r"[a-z0-9]+(?:[-:][a-z0-9]+)*")
+
+def tokenize(text: str) -> list:
+    """Lowercased word tokens; dates (2024-11-20) and times (7:30) stay whole."""
+    return _WORD.findall(text.lower())
+
+STOPWORDS = frozenset("""
+a an the is are was were be been am do does did i me my we our you your it its this that these those
+of to in on at for with by from and or as can could would should will shall may might there what which
+who whom how when where why please any some
+""".split())
+
+_SUFFIXES = ("ing", "ed", "es", "s")
+
+def stem(token: str) -> str:
+    """Light suffix stripping so visit/visiting/visits share a term."""
+    for suffix in _SUFFIXES:
+        if token.endswith(suffix) and len(token) - len(suffix) >= 3 and token.isalpha():
+            return token[:-len(suffix)]
+    return token
+
+def content_terms(text: str) -> list:
+    """Stemmed tokens with stopwords removed, for retrieval and matching."""
+    return [stem(token) for token in tokenize(text) if token not in STOPWORDS]
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token for English), good enough for budgets."""
+    return (len(text) + 3) // 4
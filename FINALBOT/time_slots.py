@@ -0,0 +1,14 @@
+from enum import Enum
+
+
+### Appointment time slots, shared by the booking bot and the availability index
+# Member names are what the booking API and appointment.time_slot store; values are how the
+# slots are shown to users.
+
+class TimeSlot(str, Enum):
+    SLOT_7_TO_8 = "7am to 8am"
+    SLOT_8_TO_9 = "8am to 9am"
+    SLOT_9_TO_10 = "9am to 10am"
+    SLOT_13_TO_14 = "1pm to 2pm"
+    SLOT_14_TO_15 = "2pm to 3pm"
+    SLOT_15_TO_16 = "3pm to 4pm"
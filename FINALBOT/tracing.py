@@ -0,0 +1,116 @@
+import functools
+import inspect
+import re
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, List, Optional, Tuple
+
+from metrics import Histogram
+
+
+### Per-request stage tracing
+# Stages (routing, write_query, validation, DB execution, answer generation, FAQ retrieval,
+# RAG generation, backend calls) are wrapped in spans. Each span feeds a per-stage histogram
+# for /metrics and is appended to the current request's trace, which the server returns as a
+# Server-Timing header next to the X-Request-ID the spans are tied to. Context variables carry
+# the request across awaits, asyncio.to_thread and LangGraph node execution.
+
+REQUEST_ID_HEADER = "X-Request-ID"
+
+_VALID_REQUEST_ID = re.compile(r"^[A-Za-z0-9._-]{1,64}$")
+
+
+class Trace:
+    def __init__(self, request_id: str):
+        self.request_id = request_id
+        self.spans: List[Tuple[str, float]] = []
+
+    def server_timing(self) -> str:
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans)
+
+
+_trace: ContextVar[Optional[Trace]] = ContextVar("trace", default=None)
+
+_stage_seconds: Dict[str, Histogram] = {}
+_stage_errors: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def new_request_id(incoming: Optional[str] = None) -> str:
+    """The caller's request ID if it is well-formed, else a fresh one."""
+    if incoming and _VALID_REQUEST_ID.match(incoming):
+        return incoming
+    return uuid.uuid4().hex[:16]
+
+
+def current_request_id() -> Optional[str]:
+    trace = _trace.get()
+    return trace.request_id if trace is not None else None
+
+
+@contextmanager
+def request_context(request_id: str):
+    trace = Trace(request_id)
+    token = _trace.set(trace)
+    try:
+        yield trace
+    finally:
+        _trace.reset(token)
+
+
+def _histogram(stage: str) -> Histogram:
+    histogram = _stage_seconds.get(stage)
+    if histogram is None:
+        with _lock:
+            histogram = _stage_seconds.setdefault(stage, Histogram())
+    return histogram
+
+
+@contextmanager
+def span(stage: str):
+    start = time.perf_counter()
+    try:
+        yield
+    except Exception:
+        with _lock:
+            _stage_errors[stage] = _stage_errors.get(stage, 0) + 1
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _histogram(stage).observe(elapsed)
+        trace = _trace.get()
+        if trace is not None:
+            trace.spans.append((stage, elapsed))
+
+
+def traced(stage: str):
+    """Decorator running a sync or async function inside span(stage)."""
+    def decorator(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(stage):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def stage_stats() -> Dict[str, dict]:
+    return {
+        stage: {
+            "errors": _stage_errors.get(stage, 0),
+            "p50_seconds": histogram.quantile(0.5),
+            "p95_seconds": histogram.quantile(0.95),
+            "seconds": histogram.snapshot(),
+        }
+        for stage, histogram in list(_stage_seconds.items())
+    }
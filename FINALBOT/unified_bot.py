@@ -1,19 +1,44 @@
-from typing import Literal, Annotated
+import asyncio
+import os
+import time
+from typing import AsyncIterator, Literal, Annotated, List, Optional, Tuple
 from typing_extensions import TypedDict
-from sql_bot import get_sql_answer
-from rag_bot import get_rag_answer
-from function_call_bot import get_function_call_answer
-from langchain_openai import ChatOpenAI
+from sql_bot import get_db, run_sql, arun_sql, astream_sql, sql_context
+from rag_bot import get_rag_answer, aget_rag_answer, astream_rag_answer, rag_prompt
+from function_call_bot import get_function_call_answer, aget_function_call_answer, ActionOutput, ACTION_FIELDS_GUIDE, validated_action
+import limits
+from answer_cache import answer_cache
+from intent_router import intent_router
+from lazy import lazy
+from tracing import traced
+from llm_registry import llm_registry
+from text_utils import normalize_question
+from speculation import Speculation
+from availability import availability, free_slot_answer, is_free_slot_question
+from sessions import sessions
+from invalidation import generation as current_generation
 
 
 class RouterOutput(TypedDict):
     """Router decision output."""
-    system: Annotated[Literal["sql", "rag"], "Which system should handle this query"]
+    system: Annotated[Literal["sql", "rag", "function_call"], "Which system should handle this query"]
 
-def route_question(question: str) -> str:
-    """Route the question to appropriate bot based on LLM decision."""  
-    # Create routing prompt
-    routing_prompt = """
+class CombinedRouterOutput(TypedDict):
+    """Router decision output, with the action and its parameters for function_call."""
+    system: Annotated[Literal["sql", "rag", "function_call"], "Which system should handle this query"]
+    action: Annotated[Optional[Literal["book_appointment", "cancel_appointment", "missing_info"]], "Endpoint action, function_call only"]
+    doctorId: Annotated[Optional[int], "ID of the doctor, book_appointment only"]
+    patientId: Annotated[Optional[int], "ID of the patient, book_appointment only"]
+    appointmentDate: Annotated[Optional[str], "Date of the appointment as YYYY-MM-DD, book_appointment only"]
+    timeSlot: Annotated[Optional[str], "Time slot such as '1pm to 2pm', book_appointment only"]
+    appointmentId: Annotated[Optional[int], "ID of the appointment to cancel, cancel_appointment only"]
+    reason: Annotated[Optional[str], "Reason for cancellation, cancel_appointment only"]
+
+# "separate": the router call picks the bot and function calls extract their action in a second call.
+# "combined": one router call returns the bot and, for function calls, the validated action too.
+ROUTER_MODE = os.getenv("ROUTER_MODE", "separate")
+
+ROUTING_PROMPT = """
         You are an intelligent routing system for a chatbot framework. Your job is to determine the appropriate bot to handle a user's question based on the task. You must choose from the following three options:
 
         1. **SQL Query Execution Bot**:
@@ -57,31 +82,320 @@ def route_question(question: str) -> str:
         **Decision**:
     """
 
-    # Get LLM decision
-    llm = ChatOpenAI(model="gpt-4o-mini")
-    structured_llm = llm.with_structured_output(RouterOutput)
-    result = structured_llm.invoke(routing_prompt.format(question=question))
+# Same instructions as ROUTING_PROMPT, plus the action extraction for function calls
+COMBINED_ROUTING_PROMPT = ROUTING_PROMPT[:ROUTING_PROMPT.index("        **Question**")] + ACTION_FIELDS_GUIDE + """        **Question**: {question}
+
+        **Decision**:
+    """
+
+def _router_llm():
+    return llm_registry.structured(RouterOutput)
+
+def _combined_router_llm():
+    return llm_registry.structured(CombinedRouterOutput)
+
+lazy("router_llm", _combined_router_llm if ROUTER_MODE == "combined" else _router_llm)
+
+def _combined_decision(result: dict) -> Tuple[str, Optional[ActionOutput]]:
+    if result["system"] != "function_call":
+        return result["system"], None
+    return result["system"], validated_action(result.get("action"), result)
+
+@traced("route")
+def decide(question: str) -> Tuple[str, Optional[ActionOutput]]:
+    """Pick the bot for the question: local fast path first, router LLM when unsure.
+
+    In combined mode an LLM-routed function call also comes with its action, else the action is None.
+    """
+    local = intent_router.decide(question)
+    if local is not None:
+        print(f"Local Decision: {local}")
+        return local.system, None
+
+    if ROUTER_MODE == "combined":
+        result = _combined_router_llm().invoke(COMBINED_ROUTING_PROMPT.format(question=question))
+        print(f"LLM Decision: {result}")
+        return _combined_decision(result)
+
+    structured_llm = _router_llm()
+    result = structured_llm.invoke(ROUTING_PROMPT.format(question=question))
 
     print(f"LLM Decision: {result}")
-    
+    return result["system"], None
+
+@traced("route")
+async def adecide(question: str, speculation: Optional[Speculation] = None) -> Tuple[str, Optional[ActionOutput]]:
+    """Async decide. The speculation, if given, is started when the router LLM has to be asked."""
+    local = intent_router.decide(question)
+    if local is not None:
+        print(f"Local Decision: {local}")
+        return local.system, None
+
+    if speculation is not None:
+        speculation.start()
+    if ROUTER_MODE == "combined":
+        async with limits.llm:
+            result = await _combined_router_llm().ainvoke(COMBINED_ROUTING_PROMPT.format(question=question))
+        print(f"LLM Decision: {result}")
+        return _combined_decision(result)
+
+    structured_llm = _router_llm()
+    async with limits.llm:
+        result = await structured_llm.ainvoke(ROUTING_PROMPT.format(question=question))
+
+    print(f"LLM Decision: {result}")
+    return result["system"], None
+
+def decide_route(question: str) -> str:
+    """The bot for the question."""
+    return decide(question)[0]
+
+async def adecide_route(question: str) -> str:
+    """Async decide_route."""
+    return (await adecide(question))[0]
+
+# Free-slot questions answered by the availability index read the same data as their SQL would
+AVAILABILITY_TABLES = ["appointment", "doctor"]
+
+@traced("availability")
+def _free_slot_answer(question: str) -> Optional[str]:
+    return free_slot_answer(question)
+
+def _availability_question(question: str, session_id: Optional[str]) -> Optional[str]:
+    # "Is that doctor free tomorrow?" needs the session's doctor ID, never its previous question
+    if not is_free_slot_question(question):
+        return None
+    return question + sessions.note(session_id, question, "sql", previous=False)
+
+def _availability_answer(question: str, session_id: Optional[str] = None) -> Optional[str]:
+    asked = _availability_question(question, session_id)
+    return _free_slot_answer(asked) if asked is not None else None
+
+async def _aavailability_answer(question: str, session_id: Optional[str] = None) -> Optional[str]:
+    asked = _availability_question(question, session_id)
+    if asked is None:
+        return None
+    if availability.needs_refresh():
+        # Reloading the index is sync DB I/O
+        return await asyncio.to_thread(_free_slot_answer, asked)
+    return _free_slot_answer(asked)
+
+def _with_note(question: str, session_id: Optional[str], system: str, action: Optional[ActionOutput]):
+    """The question as the chosen bot gets it, and the router's action if it still applies.
+
+    Routing only ever sees the question as asked. With a session note appended, a combined-mode
+    action (extracted without the note's IDs) is dropped so the booking bot extracts it again.
+    """
+    note = sessions.note(session_id, question, system)
+    return (question + note, None) if note else (question, action)
+
+def answer_with_route(question: str, session_id: Optional[str] = None) -> Tuple[str, str, List[str]]:
+    """Route and answer the question. Returns (system, answer, tables read by the SQL query)."""
+    available = _availability_answer(question, session_id)
+    if available is not None:
+        return "sql", available, AVAILABILITY_TABLES
+    system, action = decide(question)
+    asked, action = _with_note(question, session_id, system, action)
+
     # Route to appropriate system
-    if result["system"] == "sql":
-        return get_sql_answer(question)
-    elif result["system"] == "function_call":
-        return get_function_call_answer(question)
+    if system == "sql":
+        state = run_sql(asked)
+        return system, state.get("answer"), get_db().tables_in_query(state.get("query", ""))
+    elif system == "function_call":
+        return system, get_function_call_answer(asked, action), []
+    else:
+        return "rag", get_rag_answer(asked), []
+
+def _speculation(question: str) -> Speculation:
+    # Each route's cheap preparation, run while the router LLM decides; the SQL side may run
+    # the schema fingerprint query, so it counts against the DB concurrency limit
+    return Speculation({
+        "sql": lambda: sql_context(question),
+        "rag": lambda: rag_prompt(question),
+    }, limits={"sql": limits.db})
+
+async def _aroute(question: str):
+    """adecide with speculative prefetch: (system, action, the winning route's prefetched work or None)."""
+    speculation = _speculation(question)
+    try:
+        system, action = await adecide(question, speculation)
+    except Exception:
+        await speculation.take(None)
+        raise
+    system = system if system in ("sql", "function_call") else "rag"
+    return system, action, await speculation.take(system)
+
+async def _aroute_with_note(question: str, session_id: Optional[str]):
+    """_aroute on the question as asked, then (system, action, prefetched, the question for the bot)."""
+    system, action, prefetched = await _aroute(question)
+    asked, action = _with_note(question, session_id, system, action)
+    if asked != question and system == "rag":
+        # The prefetched RAG prompt embeds the question without the note
+        prefetched = None
+    return system, action, prefetched, asked
+
+async def aanswer_with_route(question: str, session_id: Optional[str] = None) -> Tuple[str, str, List[str]]:
+    """Async answer_with_route."""
+    available = await _aavailability_answer(question, session_id)
+    if available is not None:
+        return "sql", available, AVAILABILITY_TABLES
+    system, action, prefetched, asked = await _aroute_with_note(question, session_id)
+
+    if system == "sql":
+        state = await arun_sql(asked, context=prefetched)
+        return system, state.get("answer"), get_db().tables_in_query(state.get("query", ""))
+    elif system == "function_call":
+        return system, await aget_function_call_answer(asked, action), []
     else:
-        return get_rag_answer(question)
+        return "rag", await aget_rag_answer(asked, prefetched), []
+
+def route_question(question: str) -> str:
+    """Route the question to appropriate bot based on LLM decision."""  
+    return answer_with_route(question)[1]
+
+async def aroute_question(question: str) -> str:
+    """Async route_question."""
+    return (await aanswer_with_route(question))[1]
 
-def get_answer(question: str) -> str:
+def get_answer(question: str, session_id: Optional[str] = None) -> str:
     """Main entry point for unified bot."""
     if not question:
         raise ValueError("No question provided")
-    
+
+    # Answers that depend on a session's context are neither taken from nor shared through the
+    # cache; whether one did is only known once routed (the FAQ bot never gets IDs)
+    contextual = sessions.adds_context(session_id, question)
+    generation = current_generation()
+    cached = None if contextual else answer_cache.get(question)
+    if cached is not None:
+        sessions.record(session_id, question, None, cached)
+        return cached
+
+    try:
+        system, answer, tables = answer_with_route(question, session_id)
+    except Exception as e:
+        return f"Error processing question: {str(e)}"
+    if not sessions.adds_context(session_id, question, system):
+        answer_cache.put(question, system, answer, tables, generation)
+    sessions.record(session_id, question, system, answer)
+    return answer
+
+async def aget_answer(question: str, session_id: Optional[str] = None) -> str:
+    """Async entry point, used by the server."""
+    if not question:
+        raise ValueError("No question provided")
+
+    # Answers that depend on a session's context are neither taken from nor shared through the
+    # cache; whether one did is only known once routed (the FAQ bot never gets IDs)
+    contextual = sessions.adds_context(session_id, question)
+    generation = current_generation()
+    cached = None if contextual else answer_cache.get(question)
+    if cached is not None:
+        sessions.record(session_id, question, None, cached)
+        return cached
+
     try:
-        return route_question(question)
+        system, answer, tables = await aanswer_with_route(question, session_id)
     except Exception as e:
         return f"Error processing question: {str(e)}"
+    if not sessions.adds_context(session_id, question, system):
+        answer_cache.put(question, system, answer, tables, generation)
+    sessions.record(session_id, question, system, answer)
+    return answer
     
+async def _abatch_item(question: str) -> dict:
+    start = time.perf_counter()
+    item = {"route": None, "answer": None, "error": None, "cached": False}
+    if not question:
+        item["error"] = "No question provided"
+    elif (cached := answer_cache.get(question)) is not None:
+        item.update(answer=cached, cached=True)
+    else:
+        try:
+            generation = current_generation()
+            async with limits.batch:
+                system, answer, tables = await aanswer_with_route(question)
+            item.update(route=system, answer=answer)
+            answer_cache.put(question, system, answer, tables, generation)
+        except Exception as e:
+            item["error"] = f"Error processing question: {str(e)}"
+    item["elapsed_ms"] = (time.perf_counter() - start) * 1000
+    return item
+
+async def abatch_answer(questions: List[str]) -> List[dict]:
+    """Answer many questions concurrently; identical ones (after normalization) are answered once.
+
+    Results come back in input order, each with its own route, error and timing.
+    """
+    first_index = {}
+    for index, question in enumerate(questions):
+        first_index.setdefault(normalize_question(question or ""), index)
+    unique = list(first_index.items())
+    answered = await asyncio.gather(*(_abatch_item(questions[index]) for _, index in unique))
+    by_key = {key: item for (key, _), item in zip(unique, answered)}
+
+    results = []
+    for index, question in enumerate(questions):
+        key = normalize_question(question or "")
+        results.append({**by_key[key], "question": question, "duplicate_of": None if first_index[key] == index else first_index[key]})
+    return results
+
+async def astream_answer(question: str, session_id: Optional[str] = None) -> AsyncIterator[Tuple[str, dict]]:
+    """aget_answer as (event, data) pairs: routed, the route's stage events, then tokens or a whole answer."""
+    if not question:
+        raise ValueError("No question provided")
+
+    contextual = sessions.adds_context(session_id, question)
+    generation = current_generation()
+    cached = None if contextual else answer_cache.get(question)
+    if cached is not None:
+        sessions.record(session_id, question, None, cached)
+        yield "routed", {"system": "cache"}
+        yield "answer", {"text": cached}
+        return
+
+    try:
+        available = await _aavailability_answer(question, session_id)
+        if available is not None:
+            yield "routed", {"system": "sql"}
+            yield "answer", {"text": available}
+            if not sessions.adds_context(session_id, question, "sql"):
+                answer_cache.put(question, "sql", available, AVAILABILITY_TABLES, generation)
+            sessions.record(session_id, question, "sql", available)
+            return
+        system, action, prefetched, asked = await _aroute_with_note(question, session_id)
+        yield "routed", {"system": system}
+        parts, tables = [], []
+        if system == "sql":
+            query = ""
+            async for event, data in astream_sql(asked, prefetched):
+                if event == "query":
+                    query = data["query"]
+                elif event == "token":
+                    parts.append(data["text"])
+                elif event in ("answer", "denied"):
+                    parts = [data["text"]]
+                yield event, data
+            tables = get_db().tables_in_query(query)
+        elif system == "function_call":
+            parts = [await aget_function_call_answer(asked, action)]
+            yield "answer", {"text": parts[0]}
+        else:
+            async for event, data in astream_rag_answer(asked, prefetched):
+                if event == "error":
+                    # A partial answer plus an error must not be cached or remembered
+                    yield event, data
+                    return
+                parts.append(data["text"])
+                yield event, data
+    except Exception as e:
+        yield "error", {"text": f"Error processing question: {str(e)}"}
+        return
+    answer = "".join(parts).strip()
+    if not sessions.adds_context(session_id, question, system):
+        answer_cache.put(question, system, answer, tables, generation)
+    sessions.record(session_id, question, system, answer)
+
 def interactive_chat():
     print("Welcome to the Unified Bot!")
     print("Type 'exit' to quit the chat.")
@@ -113,4 +427,4 @@ if __name__ == "__main__":
     # for question in test_questions:
     #     print(f"\nQ: {question}")
     #     print(f"A: {get_answer(question)}")
-    interactive_chat()
\ No newline at end of file
+    interactive_chat()